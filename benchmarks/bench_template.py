@@ -0,0 +1,72 @@
+"""Compares the template engines of `util.fill_template` on a large template.
+
+Usage:
+    python benchmarks/bench_template.py [--sections 500] [--renders 200]
+"""
+
+import os
+import sys
+import timeit
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable-next=C0413
+import util
+
+
+SECTION = (
+    "## Section {index} for {name}\n\n"
+    "Dear {name}, your balance on {date} is **{amount}**.\n\n"
+    "| metric | value |\n|---|---|\n| visits | {visits} |\n\n"
+)
+
+
+def build_template(sections: int) -> str:
+    "returns a template of ``sections`` sections, 4 placeholders each"
+    return "".join(
+        SECTION.replace("{index}", str(index)) for index in range(sections))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=500)
+    parser.add_argument("--renders", type=int, default=200)
+    args = parser.parse_args()
+
+    data = {"name": "Jane Doe", "date": "2024-01-31", "amount": 1234.5,
+            "visits": 42}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "template.md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(build_template(args.sections))
+        size = os.path.getsize(path)
+
+        cases = {
+            "str.format (cache=False)": {"cache": False},
+            "format engine, cached": {},
+            "safe engine, cached": {"engine": "safe"},
+            "safe engine (cache=False)": {"engine": "safe", "cache": False},
+        }
+
+        print(f"template: {size / 1024:.0f} KiB, {args.renders} renders each")
+        for output_format in ("plain", "html"):
+            print(f"\n{output_format}:")
+            # HTML without the cache runs markdown on every render
+            renders = args.renders if output_format == "plain" else 5
+            for name, options in cases.items():
+                # measure the steady state of a mail merge
+                util.clear_template_cache()
+                util.fill_template(path, data, output_format, **options)
+                seconds = timeit.timeit(
+                    lambda options=options: util.fill_template(
+                        path, data, output_format, **options),
+                    number=renders,
+                )
+                print(f"  {name:<28}{seconds / renders * 1e3:9.3f} ms/render")
+
+
+if __name__ == "__main__":
+    main()
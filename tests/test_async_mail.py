@@ -0,0 +1,145 @@
+import asyncio
+import pytest
+import util
+
+async_mail = pytest.importorskip("util.async_mail")
+
+
+def test_send_mail_batch_async_limits_concurrency(monkeypatch):
+    running = 0
+    peak = 0
+
+    async def fake_api_mailing_async(subject, message, recipients, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if subject == "fail":
+            raise RuntimeError("smtp down")
+
+    monkeypatch.setattr(async_mail, "_api_mailing_async", fake_api_mailing_async)
+    monkeypatch.setattr(async_mail, "max_concurrency", 3)
+
+    messages = [
+        {"subject": "fail" if i == 4 else str(i), "message": "m", "recipients": ["a@b"]}
+        for i in range(10)
+    ]
+    results = asyncio.run(async_mail.send_mail_batch_async(messages))
+
+    assert peak == 3
+    assert [result.index for result in results] == list(range(10))
+    assert [result.success for result in results].count(False) == 1
+    assert not results[4].success
+
+
+def test_send_mail_async_falls_back(monkeypatch):
+    sent = []
+
+    def fake_outlook_mailing(**kwargs):
+        raise OSError("no outlook")
+
+    async def fake_api_mailing_async(**kwargs):
+        sent.append(kwargs["subject"])
+
+    monkeypatch.setattr(util, "_outlook_mailing", fake_outlook_mailing)
+    monkeypatch.setattr(async_mail, "_api_mailing_async", fake_api_mailing_async)
+
+    with pytest.warns(UserWarning):
+        asyncio.run(async_mail.send_mail_async("subject", "m", ["a@b"]))
+
+    assert sent == ["subject"]
+
+
+class FakeClient:
+    created = []
+
+    def __init__(self, **kwargs):
+        self.options = kwargs
+        self.is_connected = False
+        self.sent = []
+        self.drop_next = False
+        FakeClient.created.append(self)
+
+    async def connect(self):
+        await asyncio.sleep(0)
+        self.is_connected = True
+
+    async def send_message(self, msg, sender=None, recipients=None):
+        if self.drop_next:
+            self.is_connected = False
+            raise async_mail.aiosmtplib.SMTPServerDisconnected("dropped")
+        self.sent.append(recipients)
+
+    async def quit(self):
+        self.is_connected = False
+
+    def close(self):
+        self.is_connected = False
+
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    FakeClient.created = []
+    monkeypatch.setattr(async_mail.aiosmtplib, "SMTP", FakeClient)
+    monkeypatch.setattr(util, "smtp_host", "host")
+    monkeypatch.setattr(util, "smtp_port", 587)
+    monkeypatch.setattr(util, "smtp_api_key", "key")
+    monkeypatch.setattr(util, "smtp_rate", 1000)
+    monkeypatch.setattr(util, "smtp_burst", 1000)
+    monkeypatch.setattr(util, "smtp_rate_shared", False)
+    return FakeClient.created
+
+
+def test_api_mailing_async_reuses_clients(fake_smtp):
+    async def main():
+        for i in range(3):
+            await async_mail.send_mail_async(str(i), "m", ["a@b"], mode=util.EmailMode.API)
+        await async_mail.close_connections()
+
+    asyncio.run(main())
+
+    assert len(fake_smtp) == 1
+    assert len(fake_smtp[0].sent) == 3
+    assert fake_smtp[0].options["start_tls"]
+    assert not fake_smtp[0].is_connected
+
+
+def test_client_pool_retries_on_new_client(fake_smtp):
+    key = ("host", 587, "apikey")
+
+    async def main():
+        pool = async_mail._ClientPool()
+        for _ in range(2):
+            client = FakeClient()
+            await client.connect()
+            client.drop_next = True
+            await pool._checkin(key, client)
+
+        await pool.send(key, "key", {"From": "x@y"}, ["a@b"])
+
+    asyncio.run(main())
+
+    assert len(fake_smtp) == 3
+    assert len(fake_smtp[2].sent) == 1
+    assert not fake_smtp[0].is_connected and not fake_smtp[1].is_connected
+
+
+def test_api_mailing_async_shared_bucket_runs_in_thread(fake_smtp, monkeypatch, tmp_path):
+    import threading
+    from util.rate_limit import TokenBucket
+
+    bucket = TokenBucket(1000, 1000, state_path=str(tmp_path / "smtp.bucket"))
+    threads = []
+    try_acquire = bucket.try_acquire
+
+    def recording_try_acquire(*args):
+        threads.append(threading.current_thread())
+        return try_acquire(*args)
+
+    monkeypatch.setattr(bucket, "try_acquire", recording_try_acquire)
+    monkeypatch.setattr(util, "_smtp_bucket", lambda: bucket)
+
+    asyncio.run(async_mail.send_mail_async("s", "m", ["a@b"], mode=util.EmailMode.API))
+
+    assert threads and threads[0] is not threading.main_thread()
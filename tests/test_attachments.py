@@ -0,0 +1,74 @@
+import os
+from email.mime.application import MIMEApplication
+from util import attachments
+
+
+def test_attachment_part_matches_mime_application(tmp_path):
+    path = tmp_path / "report.bin"
+    path.write_bytes(os.urandom(200_000))
+
+    part = attachments.attachment_part(str(path))
+    expected = MIMEApplication(path.read_bytes(), Name="report.bin")
+
+    assert part.get_payload() == expected.get_payload()
+    assert part.get_payload(decode=True) == path.read_bytes()
+    assert part['Content-Disposition'] == 'attachment; filename="report.bin"'
+
+
+def test_encode_file_is_cached_until_file_changes(tmp_path):
+    attachments.clear_cache()
+    path = tmp_path / "report.bin"
+    path.write_bytes(b"first version")
+
+    first = attachments.encode_file(path)
+    assert attachments.encode_file(path) is first
+
+    path.write_bytes(b"second, longer version")
+    second = attachments.encode_file(path)
+    assert second is not first
+    assert second == "c2Vjb25kLCBsb25nZXIgdmVyc2lvbg==\n"
+
+
+def test_encode_file_shares_equal_contents(tmp_path):
+    attachments.clear_cache()
+    (tmp_path / "a.bin").write_bytes(b"same content")
+    (tmp_path / "b.bin").write_bytes(b"same content")
+
+    first = attachments.encode_file(tmp_path / "a.bin")
+    assert attachments.encode_file(tmp_path / "b.bin") is first
+
+
+def test_encode_file_matches_encodebytes(tmp_path):
+    import base64
+
+    attachments.clear_cache()
+    for size in (0, 1, 56, 57, 58, 57 * 1024, 57 * 1024 + 1, 200_001):
+        data = os.urandom(size)
+        path = tmp_path / f"{size}.bin"
+        path.write_bytes(data)
+
+        payload = attachments.encode_file(path)
+        assert payload == base64.encodebytes(data).decode("ascii")
+        assert len(payload) == attachments._encoded_size(size)
+
+
+def test_iter_bytes_matches_as_bytes(tmp_path):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    (tmp_path / "a.bin").write_bytes(os.urandom(100_000))
+    (tmp_path / "empty.bin").write_bytes(b"")
+
+    msg = MIMEMultipart()
+    msg["Subject"] = "Report " * 20
+    msg.attach(MIMEText("body\n.line\n", "plain"))
+    msg.attach(attachments.attachment_part(tmp_path / "a.bin"))
+    msg.attach(attachments.attachment_part(tmp_path / "empty.bin"))
+
+    parts = list(attachments.iter_bytes(msg, chunk_size=1000))
+    assert len(parts) > 100
+    assert max(len(part) for part in parts) < 2000
+    assert b"".join(parts) == msg.as_bytes()
+
+    single = MIMEText("just text")
+    assert b"".join(attachments.iter_bytes(single)) == single.as_bytes()
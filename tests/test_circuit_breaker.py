@@ -0,0 +1,34 @@
+import time
+from util.circuit_breaker import CircuitBreaker
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["skipped"] == 1
+
+
+def test_breaker_probes_after_cooldown():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
@@ -0,0 +1,133 @@
+import os
+import json
+import pytest
+import util
+from util import config
+
+
+def test_get_config_is_cached_until_file_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "settings.json").write_text(json.dumps({"host": "a", "ports": [1]}))
+
+    parsed = []
+    parse_config = config.parse_config
+    monkeypatch.setattr(config, "parse_config", lambda *args: parsed.append(args) or parse_config(*args))
+
+    first = util.get_config("settings.json")
+    second = util.get_config("settings.json")
+    assert first == second == {"host": "a", "ports": [1]}
+    assert len(parsed) == 1
+
+    # callers get private copies
+    first["ports"].append(2)
+    assert util.get_config("settings.json")["ports"] == [1]
+
+    (tmp_path / "settings.json").write_text(json.dumps({"host": "changed"}))
+    assert util.get_config("settings.json") == {"host": "changed"}
+    assert len(parsed) == 2
+
+
+def test_get_config_readonly_and_invalidate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "settings.yaml").write_text("host: a\nports:\n  - 1\n")
+
+    frozen = util.get_config("settings.yaml", file_type="yaml", readonly=True)
+    assert frozen["ports"] == (1,)
+    with pytest.raises(TypeError):
+        frozen["host"] = "b"
+    assert util.get_config("settings.yaml", file_type="yaml", readonly=True) is frozen
+
+    util.invalidate_config(os.path.join(tmp_path, "settings.yaml"))
+    assert util.get_config("settings.yaml", file_type="yaml", readonly=True) is not frozen
+
+
+def test_get_config_invalid_type(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "settings.toml").write_text("")
+
+    with pytest.raises(ValueError):
+        util.get_config("settings.toml", file_type="toml")
+
+
+def test_get_layered_config_merges_layers(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    (home / "Project Configurations").mkdir(parents=True)
+    project = tmp_path / "project"
+    project.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("USERPROFILE", str(home))
+    monkeypatch.chdir(project)
+
+    (home / "Project Configurations" / "base.json").write_text(
+        json.dumps({"smtp": {"host": "global", "port": 25}, "debug": False}))
+    (project / "base.json").write_text(json.dumps({"smtp": {"host": "project"}}))
+    (project / "extra.yaml").write_text("debug: true\n")
+    monkeypatch.setenv("APP__SMTP__PORT", "587")
+
+    merged = util.get_layered_config(["base.json", "extra.yaml"], env_prefix="APP")
+
+    assert merged == {"smtp": {"host": "project", "port": 587}, "debug": True}
+
+
+def test_get_layered_config_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "base.json").write_text(json.dumps({"host": "a"}))
+    snapshot = str(tmp_path / "config.snapshot")
+
+    assert util.get_layered_config("base.json", snapshot_path=snapshot) == {"host": "a"}
+    assert os.path.exists(snapshot)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("sources should not be parsed")
+
+    monkeypatch.setattr(config, "load_config", fail)
+    assert util.get_layered_config("base.json", snapshot_path=snapshot) == {"host": "a"}
+
+    monkeypatch.undo()
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "base.json").write_text(json.dumps({"host": "changed"}))
+    assert util.get_layered_config("base.json", snapshot_path=snapshot) == {"host": "changed"}
+
+
+def test_get_layered_config_env_matches_existing_case(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "base.json").write_text(
+        json.dumps({"apiKey": "file", "SMTP": {"Host": "a"}}))
+    monkeypatch.setenv("APP__APIKEY", "env")
+    monkeypatch.setenv("APP__SMTP__HOST", "b")
+    monkeypatch.setenv("APP__NEW_KEY", "1")
+
+    merged = util.get_layered_config("base.json", env_prefix="APP")
+
+    assert merged == {"apiKey": "env", "SMTP": {"Host": "b"}, "new_key": 1}
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_get_layered_config_snapshot_permissions(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "base.json").write_text(json.dumps({"password": "secret"}))
+    snapshot = str(tmp_path / "config.snapshot")
+
+    util.get_layered_config("base.json", snapshot_path=snapshot)
+    assert os.stat(snapshot).st_mode & 0o777 == 0o600
+
+    loaded = []
+    load_config = config.load_config
+    monkeypatch.setattr(config, "load_config", lambda *args: loaded.append(args) or load_config(*args))
+
+    os.chmod(snapshot, 0o666)
+    assert util.get_layered_config("base.json", snapshot_path=snapshot) == {"password": "secret"}
+    assert len(loaded) == 1
+    assert os.stat(snapshot).st_mode & 0o777 == 0o600
+
+
+def test_get_layered_config_missing(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(FileNotFoundError):
+        util.get_layered_config("missing.json")
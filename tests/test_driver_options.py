@@ -0,0 +1,91 @@
+from urllib.parse import unquote
+import pytest
+
+pytest.importorskip("selenium")
+
+from util.selenium import (
+    AD_URL_PATTERNS, Browser, DriverProfile,
+    _PROFILES, _driver_options, _pac_url,
+)
+
+
+def options(browser, profile, **kwargs):
+    return _driver_options(browser, settings=_PROFILES[profile], **kwargs)
+
+
+def test_default_profile_keeps_options_unchanged():
+    firefox = options(Browser.FIREFOX, DriverProfile.DEFAULT)
+    chrome = options(Browser.CHROME, DriverProfile.DEFAULT)
+
+    assert firefox.page_load_strategy == "normal"
+    assert "permissions.default.image" not in firefox.preferences
+    assert "network.proxy.type" not in firefox.preferences
+    assert chrome.page_load_strategy == "normal"
+    assert chrome.arguments == []
+    assert "prefs" not in chrome.experimental_options
+
+
+def test_default_profile_download_dir(tmp_path):
+    chrome = options(
+        Browser.CHROME, DriverProfile.DEFAULT, download_dir=str(tmp_path))
+
+    assert chrome.experimental_options["prefs"] == {
+        "download.default_directory": str(tmp_path)}
+
+
+def test_eager_profile():
+    chrome = options(Browser.CHROME, DriverProfile.EAGER)
+
+    assert chrome.page_load_strategy == "eager"
+    assert "--disable-extensions" in chrome.arguments
+    assert "--disable-gpu" in chrome.arguments
+    assert "--blink-settings=imagesEnabled=false" not in chrome.arguments
+
+
+def test_light_profile_firefox():
+    firefox = options(Browser.FIREFOX, DriverProfile.LIGHT)
+
+    assert firefox.page_load_strategy == "eager"
+    assert firefox.preferences["permissions.default.image"] == 2
+    assert firefox.preferences["browser.display.use_document_fonts"] == 0
+    assert firefox.preferences["gfx.downloadable_fonts.enabled"] is False
+
+
+def test_light_profile_chrome_merges_prefs(tmp_path):
+    chrome = options(
+        Browser.CHROME, DriverProfile.LIGHT, download_dir=str(tmp_path))
+
+    assert "--blink-settings=imagesEnabled=false" in chrome.arguments
+    assert chrome.experimental_options["prefs"] == {
+        "download.default_directory": str(tmp_path),
+        "profile.managed_default_content_settings.images": 2,
+    }
+
+
+def test_blocked_urls_firefox_use_pac():
+    patterns = _PROFILES[DriverProfile.BLOCKING]["blocked_urls"]
+    firefox = options(
+        Browser.FIREFOX, DriverProfile.BLOCKING, blocked_urls=patterns)
+
+    assert patterns == AD_URL_PATTERNS
+    assert firefox.preferences["network.proxy.type"] == 2
+    assert firefox.preferences["network.proxy.autoconfig_url"] == _pac_url(patterns)
+
+
+def test_pac_url():
+    url = _pac_url(["*.css", '*"quoted"*'])
+
+    assert url.startswith("data:text/javascript,")
+    script = unquote(url.removeprefix("data:text/javascript,"))
+    assert 'shExpMatch(url, "*.css")' in script
+    assert 'shExpMatch(url, "*\\"quoted\\"*")' in script
+    assert "PROXY 127.0.0.1:9" in script
+
+
+def test_minimal_profile():
+    settings = _PROFILES[DriverProfile.MINIMAL]
+
+    assert settings["page_load_strategy"] == "none"
+    assert "*.css" in settings["blocked_urls"]
+    assert not settings["maximize"]
+    assert _PROFILES[DriverProfile.DEFAULT]["maximize"]
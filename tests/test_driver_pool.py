@@ -0,0 +1,226 @@
+import threading
+import pytest
+
+pytest.importorskip("selenium")
+
+from selenium.common.exceptions import WebDriverException
+from util.selenium import DriverPool, ScrapeExecutor, reset_driver, scrape
+
+
+class FakeSwitchTo:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def window(self, handle):
+        self.driver.current = handle
+
+
+class FakeDriver:
+    def __init__(self):
+        self.window_handles = ["main"]
+        self.current = "main"
+        self.cookies = {"session": "1"}
+        self.url = None
+        self.quit_called = False
+        self.crashed = False
+        self.switch_to = FakeSwitchTo(self)
+
+    def _check(self):
+        if self.crashed:
+            raise WebDriverException("browser crashed")
+
+    def get(self, url):
+        self._check()
+        self.url = url
+
+    def close(self):
+        self.window_handles.remove(self.current)
+
+    def execute_script(self, script):
+        self._check()
+
+    def delete_all_cookies(self):
+        self._check()
+        self.cookies = {}
+
+    def quit(self):
+        self.quit_called = True
+
+    def set_page_load_timeout(self, seconds):
+        self.timeout = seconds
+
+    def set_script_timeout(self, seconds):
+        self.script_timeout = seconds
+
+
+def make_factory(drivers):
+    def factory():
+        driver = FakeDriver()
+        drivers.append(driver)
+        return driver
+    return factory
+
+
+def test_pool_prewarms_and_reuses_drivers():
+    drivers = []
+    with DriverPool(size=2, factory=make_factory(drivers)) as pool:
+        assert len(drivers) == 2
+
+        for _ in range(5):
+            with pool.lease() as driver:
+                driver.get("https://example.com")
+                driver.window_handles.append("popup")
+
+        assert len(drivers) == 2
+        assert driver.window_handles == ["main"]
+        assert driver.cookies == {}
+        assert driver.url == "about:blank"
+
+    assert all(driver.quit_called for driver in drivers)
+
+
+def test_pool_recycles_drivers():
+    drivers = []
+    pool = DriverPool(size=1, max_uses=2, prewarm=False,
+                      factory=make_factory(drivers))
+
+    for _ in range(4):
+        with pool.lease():
+            pass
+    assert len(drivers) == 2
+    assert drivers[0].quit_called
+
+    with pytest.raises(WebDriverException):
+        with pool.lease() as driver:
+            raise WebDriverException("tab crashed")
+    assert driver.quit_called
+
+    with pool.lease() as driver:
+        driver.crashed = True
+    assert driver.quit_called
+    assert len(pool) == 0
+
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+
+def test_pool_limits_concurrent_leases():
+    drivers = []
+    pool = DriverPool(size=1, factory=make_factory(drivers))
+
+    held = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.05)
+
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    pool.release(held)
+    waiter.join(timeout=5)
+
+    assert got == [held]
+    pool.close()
+
+
+def test_reset_driver_reports_crashes():
+    driver = FakeDriver()
+    assert reset_driver(driver)
+    driver.crashed = True
+    assert not reset_driver(driver)
+
+
+def test_scrape_runs_jobs_in_parallel(tmp_path):
+    drivers, download_dirs = [], []
+    started = threading.Barrier(3, timeout=5)
+
+    def factory(download_dir):
+        download_dirs.append(download_dir)
+        return make_factory(drivers)()
+
+    def job(driver):
+        started.wait()
+        return driver.url
+
+    urls = [f"https://example.com/{i}" for i in range(3)]
+    results = scrape([(url, job) for url in urls], workers=3,
+                     download_dir=str(tmp_path), factory=factory, timeout=5)
+
+    assert [result.value for result in results] == urls
+    assert [result.index for result in results] == [0, 1, 2]
+    assert sorted(download_dirs) == [
+        str(tmp_path / f"worker-{worker}") for worker in range(3)]
+    assert all(driver.timeout == 5 and driver.quit_called for driver in drivers)
+
+
+def test_scrape_retries_and_reports_errors():
+    drivers = []
+    calls = {}
+
+    def flaky(driver):
+        calls["flaky"] = calls.get("flaky", 0) + 1
+        if calls["flaky"] == 1:
+            driver.crashed = True
+            raise WebDriverException("crashed")
+        return "ok"
+
+    def broken(driver):
+        raise ValueError("no table")
+
+    with ScrapeExecutor(workers=1, retries=1,
+                        factory=lambda download_dir: make_factory(drivers)()) \
+            as executor:
+        results = executor.run([
+            ("https://example.com/a", flaky),
+            ("https://example.com/b", broken),
+            (None, lambda driver: "no url"),
+        ])
+
+    assert results[0].value == "ok" and results[0].attempts == 2
+    assert isinstance(results[1].error, ValueError)
+    assert results[1].attempts == 2
+    assert results[2].value == "no url"
+    # the crashed browser was replaced
+    assert len(drivers) == 2 and drivers[0].quit_called
+
+
+def test_scrape_stops_jobs_after_job_timeout():
+    drivers = []
+
+    def hangs(driver):
+        # polls the page until the browser is quit under it
+        while not driver.quit_called:
+            threading.Event().wait(0.01)
+        raise WebDriverException("browser gone")
+
+    with ScrapeExecutor(workers=1, retries=1, job_timeout=0.1,
+                        factory=lambda download_dir: make_factory(drivers)()) \
+            as executor:
+        results = executor.run([
+            ("https://example.com/a", hangs),
+            ("https://example.com/b", lambda driver: driver.url),
+        ])
+
+    assert isinstance(results[0].error, TimeoutError)
+    assert results[0].attempts == 2
+    assert results[1].value == "https://example.com/b"
+    # each timed out attempt restarted the browser
+    assert len(drivers) == 3 and all(driver.quit_called for driver in drivers)
+
+
+def test_pool_quits_leased_drivers_when_collected():
+    import gc
+    import weakref
+
+    drivers = []
+    pool = DriverPool(size=2, factory=make_factory(drivers))
+    leased = pool.acquire()
+    pool.close()
+    assert not leased.quit_called
+
+    reference = weakref.ref(pool)
+    del pool
+    gc.collect()
+
+    assert reference() is None
+    assert len(drivers) == 2 and all(driver.quit_called for driver in drivers)
@@ -0,0 +1,39 @@
+import json
+import subprocess
+import sys
+
+# cold start budget of `import util`, in seconds
+IMPORT_BUDGET = 0.3
+
+HEAVY_MODULES = ["pandas", "openpyxl", "yaml", "markdown", "win32com", "sqlite3"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import util
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def _measure():
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def test_import_does_not_load_heavy_dependencies():
+    assert _measure()["loaded"] == []
+
+
+def test_import_time_budget():
+    best = min(_measure()["elapsed"] for _ in range(3))
+    print(f"import util: {best * 1000:.1f} ms")
+    assert best < IMPORT_BUDGET, f"import util took {best:.3f}s"
@@ -133,3 +133,125 @@ def test_fill_template_plain():
         data={"sub_heading": "Hello, World!"}
     )
     assert "## Hello, World!" == output
+
+
+def test_send_mail_batch_reports_failures(monkeypatch):
+    sent = []
+
+    def fake_api_mailing(subject, message, recipients, **kwargs):
+        if "fail" in subject:
+            raise RuntimeError("smtp down")
+        sent.append(subject)
+
+    monkeypatch.setattr(util, "_api_mailing", fake_api_mailing)
+
+    results = util.send_mail_batch([
+        {"subject": "one", "message": "m", "recipients": ["a@b"]},
+        {"subject": "fail", "message": "m", "recipients": ["a@b"]},
+        {"subject": "three", "message": "m", "recipients": ["a@b"]},
+    ])
+
+    assert [result.success for result in results] == [True, False, True]
+    assert isinstance(results[1].error, RuntimeError)
+    assert sorted(sent) == ["one", "three"]
+
+
+def test_send_mail_batch_rate(monkeypatch):
+    buckets = []
+
+    def fake_api_mailing(subject, message, recipients, **kwargs):
+        bucket = util._smtp_bucket()
+        buckets.append((bucket.rate, bucket.burst))
+
+    monkeypatch.setattr(util, "_api_mailing", fake_api_mailing)
+    monkeypatch.setattr(util, "smtp_rate_shared", False)
+    messages = [{"subject": "s", "message": "m", "recipients": ["a@b"]}] * 3
+
+    util.send_mail_batch(messages, rate=10, burst=5)
+    assert buckets == [(10.0, 5)] * 3
+
+    buckets.clear()
+    util.send_mail_batch(messages)
+    assert buckets == [(util.smtp_rate, util.smtp_burst)] * 3
+    assert util._smtp_bucket().rate == util.smtp_rate
+
+
+def test_send_mail_batch_rate_shared(tmp_path, monkeypatch):
+    import tempfile
+    from util import rate_limit
+
+    rates = []
+
+    def fake_api_mailing(subject, message, recipients, **kwargs):
+        bucket = util._smtp_bucket()
+        bucket.acquire()
+        rates.append(bucket.current_rate)
+
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(rate_limit, "_buckets", {})
+    monkeypatch.setattr(util, "_api_mailing", fake_api_mailing)
+    monkeypatch.setattr(util, "smtp_rate_shared", True)
+    monkeypatch.setattr(util, "smtp_burst", 2)
+    messages = [{"subject": "s", "message": "m", "recipients": ["a@b"]}]
+
+    util.send_mail_batch(messages)
+    util.send_mail_batch(messages * 3, rate=100, burst=5)
+    util.send_mail_batch(messages)
+    assert rates == [util.smtp_rate] + [100.0] * 3 + [util.smtp_rate]
+
+    batch = rate_limit.get_bucket(
+        f"smtp-{util.smtp_host}-{util.smtp_port}", 100, 5)
+    assert batch.state_path != util._smtp_bucket().state_path
+
+
+def test_send_mail_input_errors_keep_modes_healthy(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_api_mailing(**kwargs):
+        calls.append(kwargs)
+        raise ValueError("bad address")
+
+    monkeypatch.setattr(util, "_outlook_mailing", fake_api_mailing)
+    monkeypatch.setattr(util, "_api_mailing", fake_api_mailing)
+    util.reset_mode_health()
+    modes = [util.EmailMode.OUTLOOK, util.EmailMode.API]
+
+    for _ in range(util.mode_failure_threshold + 1):
+        with pytest.raises(FileNotFoundError):
+            util._send_with_fallback(
+                "s", "m", ["a@b"], attachments=[tmp_path / "missing.xlsx"],
+                modes=modes)
+        with pytest.raises(ValueError):
+            util._send_with_fallback("s", "m", ["a@b"], "rtf", modes=modes)
+        with pytest.raises(ValueError, match="bad address"):
+            util._send_with_fallback("s", "m", ["a@b"], modes=modes)
+
+    assert len(calls) == util.mode_failure_threshold + 1
+    health = util.get_mode_health()
+    assert all(mode["state"] == "closed" for mode in health.values())
+    util.reset_mode_health()
+
+
+def test_send_mail_skips_failing_mode(monkeypatch):
+    outlook_calls = []
+    api_calls = []
+
+    def fake_outlook_mailing(**kwargs):
+        outlook_calls.append(kwargs)
+        raise OSError("no outlook")
+
+    monkeypatch.setattr(util, "_outlook_mailing", fake_outlook_mailing)
+    monkeypatch.setattr(util, "_api_mailing", lambda **kwargs: api_calls.append(kwargs))
+    util.reset_mode_health()
+
+    with pytest.warns(UserWarning):
+        for _ in range(10):
+            util.send_mail("subject", "message", ["a@b"])
+
+    assert len(outlook_calls) == util.mode_failure_threshold
+    assert len(api_calls) == 10
+
+    health = util.get_mode_health()
+    assert health["outlook"]["state"] == "open"
+    assert health["api"]["successes"] == 10
+    util.reset_mode_health()
@@ -0,0 +1,96 @@
+import time
+from util.mail_queue import MailQueue
+
+
+def test_queue_sends_and_removes_mail(tmp_path):
+    sent = []
+    queue = MailQueue(str(tmp_path / "queue.sqlite3"), sender=lambda **mail: sent.append(mail))
+
+    queue.put(subject="hello", message="m", recipients=["a@b"])
+
+    assert queue.pending() == 1
+    assert queue.drain() == 1
+    assert sent == [{"subject": "hello", "message": "m", "recipients": ["a@b"]}]
+    assert queue.pending() == 0
+
+
+def test_queue_retries_then_dead_letters(tmp_path):
+    def failing_sender(**mail):
+        raise ConnectionError("smtp host down")
+
+    queue = MailQueue(
+        str(tmp_path / "queue.sqlite3"),
+        sender=failing_sender,
+        max_attempts=3,
+        base_delay=0,
+    )
+    queue.put(subject="hello", message="m", recipients=["a@b"])
+
+    assert queue.drain() == 3
+    assert queue.pending() == 0
+
+    dead = queue.dead_letters()
+    assert len(dead) == 1
+    assert dead[0]["attempts"] == 3
+    assert "smtp host down" in dead[0]["error"]
+
+    assert queue.requeue_dead() == 1
+    assert queue.pending() == 1
+
+
+def test_queue_backs_off_between_attempts(tmp_path):
+    queue = MailQueue(
+        str(tmp_path / "queue.sqlite3"),
+        sender=lambda **mail: 1 / 0,
+        base_delay=60,
+    )
+    queue.put(subject="hello", message="m", recipients=["a@b"])
+
+    assert queue.drain() == 1
+    assert queue.drain() == 0
+    assert queue.pending() == 1
+
+
+def test_queue_worker_drains_in_background(tmp_path):
+    sent = []
+    queue = MailQueue(str(tmp_path / "queue.sqlite3"), sender=lambda **mail: sent.append(mail))
+    queue.start_worker(poll_interval=0.05)
+
+    try:
+        queue.put(subject="hello", message="m", recipients=["a@b"])
+        deadline = time.monotonic() + 5
+        while not sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        queue.stop_worker()
+
+    assert len(sent) == 1
+
+
+def test_drain_timeout(tmp_path):
+    queue = MailQueue(str(tmp_path / "queue.sqlite3"), sender=lambda **mail: time.sleep(0.05))
+    for _ in range(5):
+        queue.put(subject="hello", message="m", recipients=["a@b"])
+
+    assert queue.drain(timeout=0.01) == 1
+    assert queue.pending() == 4
+
+
+def test_flush_mail_queue_and_exit_hook(tmp_path, monkeypatch):
+    import util
+
+    sent = []
+    monkeypatch.setattr(util, "mail_queue_path", str(tmp_path / "queue.sqlite3"))
+    monkeypatch.setattr(util, "_send_queued_mail", lambda **mail: sent.append(mail))
+
+    queue = MailQueue(util.mail_queue_path, sender=util._send_queued_mail)
+    queue.put(subject="earlier process", message="m", recipients=["a@b"])
+    assert util.flush_mail_queue() == 1
+
+    # the worker of a short script had no time to deliver
+    queue.put(subject="at exit", message="m", recipients=["a@b"])
+    monkeypatch.setattr(util, "_mail_queue", queue)
+    util._flush_mail_queue_at_exit()
+
+    assert [mail["subject"] for mail in sent] == ["earlier process", "at exit"]
+    assert queue.pending() == 0
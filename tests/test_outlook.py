@@ -0,0 +1,103 @@
+import threading
+import pytest
+from util import outlook
+
+
+class FakeAttachments:
+    def __init__(self):
+        self.paths = []
+
+    def Add(self, path):
+        self.paths.append(path)
+
+
+class FakeMailItem:
+    def __init__(self, application):
+        self.application = application
+        self.Attachments = FakeAttachments()
+
+    def Send(self):
+        self.application.sent.append(self)
+
+
+class FakeApplication:
+    def __init__(self):
+        self.sent = []
+        self.broken = False
+
+    def CreateItem(self, item_type):
+        if self.broken:
+            raise OSError("RPC server is unavailable")
+        return FakeMailItem(self)
+
+
+@pytest.fixture
+def applications():
+    created = []
+
+    def dispatcher():
+        application = FakeApplication()
+        created.append(application)
+        return application
+
+    outlook.set_dispatcher(dispatcher)
+    yield created
+    outlook.set_dispatcher(None)
+
+
+def test_application_is_reused(applications):
+    for _ in range(5):
+        outlook.send(subject="s", message="m", recipients=["a@b"])
+
+    assert len(applications) == 1
+    assert len(applications[0].sent) == 5
+
+
+def test_application_per_thread(applications):
+    outlook.send(subject="s", message="m", recipients=["a@b"])
+    thread = threading.Thread(
+        target=outlook.send,
+        kwargs={"subject": "s", "message": "m", "recipients": ["a@b"]},
+    )
+    thread.start()
+    thread.join()
+
+    assert len(applications) == 2
+
+
+def test_stale_application_is_replaced(applications):
+    outlook.send(subject="s", message="m", recipients=["a@b"])
+    applications[0].broken = True
+    outlook.send(subject="s", message="m", recipients=["a@b"])
+
+    assert len(applications) == 2
+    assert len(applications[1].sent) == 1
+
+
+def test_send_many(applications):
+    errors = outlook.send_many([
+        {"subject": "s", "message": "m", "recipients": ["a@b"], "attachments": ["report.xlsx"]},
+        {"subject": "s", "message": "m", "recipients": ["a@b"], "mail_type": "rtf"},
+        {"subject": "s", "message": "<b>m</b>", "recipients": ["a@b"], "mail_type": "html"},
+    ])
+
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], ValueError)
+    assert len(applications) == 1
+    assert applications[0].sent[0].Attachments.paths[0].endswith("report.xlsx")
+    assert applications[0].sent[1].HTMLBody == "<b>m</b>"
+
+
+def test_send_mail_batch_uses_one_application(applications):
+    import util
+
+    results = util.send_mail_batch([
+        {"subject": "s", "message": "m", "recipients": ["a@b"]},
+        {"subject": "s", "message": "m", "recipients": ["a@b"], "mail_type": "rtf"},
+        {"subject": "s", "message": "m", "recipients": ["c@d"]},
+    ], mode=util.EmailMode.OUTLOOK, max_workers=3)
+
+    assert [result.success for result in results] == [True, False, True]
+    assert isinstance(results[1].error, ValueError)
+    assert len(applications) == 1
+    assert [item.To for item in applications[0].sent] == ["a@b", "c@d"]
@@ -0,0 +1,68 @@
+import os
+import time
+import tempfile
+import pytest
+from util import rate_limit
+from util.rate_limit import TokenBucket
+
+
+def test_bucket_allows_burst_without_waiting():
+    bucket = TokenBucket(rate=1, burst=3)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.try_acquire() == pytest.approx(1, abs=0.05)
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(rate=100, burst=1)
+
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+
+    elapsed = time.monotonic() - start
+    assert 0.03 <= elapsed < 0.5
+
+
+def test_bucket_backoff_and_recover():
+    bucket = TokenBucket(rate=10, burst=1)
+
+    bucket.backoff()
+    assert bucket.current_rate == pytest.approx(5)
+
+    for _ in range(10):
+        bucket.recover()
+    assert bucket.current_rate == pytest.approx(10)
+
+
+def test_shared_bucket_state(tmp_path):
+    state_path = str(tmp_path / "smtp.bucket")
+    first = TokenBucket(rate=1, burst=2, state_path=state_path)
+    second = TokenBucket(rate=1, burst=2, state_path=state_path)
+
+    assert first.try_acquire() == 0
+    assert second.try_acquire() == 0
+    assert first.try_acquire() > 0
+
+
+def test_bucket_falls_back_to_process_state(tmp_path):
+    state_path = str(tmp_path / "missing" / "smtp.bucket")
+    bucket = TokenBucket(rate=1, burst=2, state_path=state_path)
+
+    with pytest.warns(UserWarning):
+        assert bucket.try_acquire() == 0
+    assert bucket.state_path is None
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX only")
+def test_shared_buckets_are_per_user(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(rate_limit, "_buckets", {})
+
+    bucket = rate_limit.get_bucket("smtp-host-587", rate=1)
+
+    directory = os.path.dirname(bucket.state_path)
+    assert directory == os.path.join(str(tmp_path), f"util-{os.getuid()}")
+    assert os.stat(directory).st_mode & 0o777 == 0o700
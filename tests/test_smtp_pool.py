@@ -0,0 +1,202 @@
+import smtplib
+import threading
+import pytest
+from util.smtp_pool import SMTPConnectionPool
+
+
+class FakeSMTP:
+    def __init__(self, fail_sends=0):
+        self.sent = []
+        self.closed = False
+        self.fail_sends = fail_sends
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        if self.fail_sends:
+            self.fail_sends -= 1
+            raise smtplib.SMTPServerDisconnected("dropped")
+        self.sent.append((from_addr, to_addrs, msg))
+        return {}
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+def make_factory(sessions):
+    def factory(host, port, username, password):
+        server = FakeSMTP()
+        sessions.append(server)
+        return server
+    return factory
+
+
+def test_pool_reuses_session():
+    sessions = []
+    pool = SMTPConnectionPool(factory=make_factory(sessions))
+
+    for _ in range(5):
+        pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+
+    assert len(sessions) == 1
+    assert len(sessions[0].sent) == 5
+
+
+def test_pool_reconnects_after_disconnect():
+    sessions = []
+    factory = make_factory(sessions)
+    pool = SMTPConnectionPool(factory=factory)
+
+    pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+    sessions[0].fail_sends = 1
+    pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+
+    assert len(sessions) == 2
+    assert sessions[0].closed
+    assert len(sessions[1].sent) == 1
+
+
+def test_pool_retries_on_new_session_when_all_idle_are_dead():
+    sessions = []
+    pool = SMTPConnectionPool(factory=make_factory(sessions))
+
+    with pool.connection("host", 587, "user", "pass"):
+        with pool.connection("host", 587, "user", "pass"):
+            pass
+    assert len(pool) == 2
+
+    for server in sessions:
+        server.fail_sends = 1
+    pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+
+    assert len(sessions) == 3
+    assert sessions[0].closed and sessions[1].closed
+    assert len(sessions[2].sent) == 1
+    assert len(pool) == 1
+
+
+def test_pool_expires_idle_sessions():
+    sessions = []
+    pool = SMTPConnectionPool(idle_timeout=0, factory=make_factory(sessions))
+
+    pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+    pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+
+    assert len(sessions) == 2
+    assert sessions[0].closed
+
+
+def test_pool_bounds_sessions_across_threads():
+    sessions = []
+    pool = SMTPConnectionPool(max_size=2, factory=make_factory(sessions))
+
+    threads = [
+        threading.Thread(
+            target=pool.sendmail,
+            args=("host", 587, "user", "pass", "a@b", ["c@d"], "msg"),
+        )
+        for _ in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(sessions) <= 2
+    assert sum(len(server.sent) for server in sessions) == 20
+
+    pool.close()
+    assert all(server.closed for server in sessions)
+    with pytest.raises(RuntimeError):
+        pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+
+
+def test_pool_quits_expired_sessions_without_the_lock():
+    sessions, lengths = [], []
+    pool = SMTPConnectionPool(idle_timeout=0, factory=make_factory(sessions))
+
+    pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+
+    def quit():
+        # another thread can use the pool while the session says goodbye
+        thread = threading.Thread(target=lambda: lengths.append(len(pool)))
+        thread.start()
+        thread.join(5)
+        sessions[0].closed = True
+
+    sessions[0].quit = quit
+    pool.sendmail("host", 587, "user", "pass", "a@b", ["c@d"], "msg")
+
+    assert sessions[0].closed
+    assert lengths == [0]
+
+
+def test_default_factory_sets_a_timeout(monkeypatch):
+    opened = []
+
+    class Server(FakeSMTP):
+        def __init__(self, host, port, timeout=None):
+            super().__init__()
+            opened.append(timeout)
+
+        def ehlo(self):
+            pass
+
+        def login(self, username, password):
+            pass
+
+    monkeypatch.setattr(smtplib, "SMTP_SSL", Server)
+    pool = SMTPConnectionPool(timeout=5)
+    pool.sendmail("host", 465, "user", "pass", "a@b", ["c@d"], "msg")
+
+    assert opened == [5]
+
+
+def test_pool_streams_messages(tmp_path):
+    import os
+    import socket
+    import util
+
+    listener = socket.create_server(("127.0.0.1", 0))
+    received = []
+
+    def serve():
+        connection, _ = listener.accept()
+        with connection, connection.makefile("rb") as reader:
+            connection.sendall(b"220 ready\r\n")
+            for line in reader:
+                command = line[:4].upper()
+                if command == b"DATA":
+                    connection.sendall(b"354 go on\r\n")
+                    data = b""
+                    while not data.endswith(b"\r\n.\r\n"):
+                        data += reader.readline()
+                    received.append(data)
+                    connection.sendall(b"250 queued\r\n")
+                elif command == b"QUIT":
+                    connection.sendall(b"221 bye\r\n")
+                    return
+                else:
+                    connection.sendall(b"250 ok\r\n")
+
+    server = threading.Thread(target=serve)
+    server.start()
+
+    path = tmp_path / "report.bin"
+    path.write_bytes(os.urandom(300_000))
+    msg, recipients = util._build_message(
+        "Report", ".hidden line\n..and more", ["a@b"], attachments=[path])
+
+    pool = SMTPConnectionPool(factory=lambda host, port, *_: smtplib.SMTP(
+        host, port, timeout=5))
+    pool.sendmail("127.0.0.1", listener.getsockname()[1], None, None,
+                  "me@x", recipients, msg)
+    pool.close()
+    server.join(5)
+    listener.close()
+
+    expected = smtplib._quote_periods(
+        smtplib._fix_eols(msg.as_bytes().decode("ascii")).encode("ascii"))
+    assert received == [expected + b".\r\n"]
+    assert b"\r\n..hidden line\r\n...and more" in received[0]
@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+import util
+from util import styles
+
+
+def _header(path, sheet_name=None):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path)
+    worksheet = workbook[sheet_name] if sheet_name else workbook.active
+    return [
+        (cell.style, cell.fill.fgColor.rgb, cell.font.b,
+         cell.font.color and cell.font.color.rgb)
+        for cell in worksheet[1]
+    ]
+
+
+def test_presets_are_registered_and_cached():
+    assert {"default", "dark"} <= set(styles.header_style_names())
+
+    style = util.register_header_style("test-red", header_color="FF0000")
+    assert util.get_header_style("test-red") == style
+    assert styles.components(style) is styles.components(style)
+
+    with pytest.raises(ValueError, match="Unknown header style"):
+        util.get_header_style("missing")
+
+
+def test_style_excel_preset(tmp_path):
+    path = str(tmp_path / "report.xlsx")
+    pd.DataFrame({"a": [1], "b": [2]}).to_excel(path, index=False)
+
+    util.style_excel(path, preset="dark")
+    util.style_excel(path, preset="dark")
+
+    assert _header(path) == [("Header dark", "001F4E78", True, "00FFFFFF")] * 2
+
+    from openpyxl import load_workbook
+    assert load_workbook(path).named_styles.count("Header dark") == 1
+
+
+def test_redefined_preset_updates_named_style(tmp_path):
+    path = str(tmp_path / "report.xlsx")
+    pd.DataFrame({"a": [1]}).to_excel(path, index=False)
+
+    util.register_header_style("test-changing", header_color="00FF00")
+    util.style_excel(path, preset="test-changing")
+    util.register_header_style("test-changing", header_color="0000FF")
+    util.style_excel(path, preset="test-changing")
+
+    assert _header(path)[0][1] == "000000FF"
+
+
+def test_preset_in_writers(tmp_path):
+    df = pd.DataFrame({"a": [1]})
+    touched = str(tmp_path / "touched.xlsx")
+    streamed = str(tmp_path / "streamed.xlsx")
+    patched = str(tmp_path / "patched.xlsx")
+
+    util.touch_excel_sheets({"data": df}, touched, preset="green")
+    util.stream_excel(df, streamed, preset="green")
+    df.to_excel(patched, index=False)
+    util.style_excel(patched, preset="green", header_only=True)
+
+    assert _header(touched, "data")[0][:2] == ("Header green", "00E2EFDA")
+    assert _header(streamed)[0][:2] == ("Header green", "00E2EFDA")
+    # the XML patch applies the preset's formatting without a named style
+    assert _header(patched)[0][1:3] == ("00E2EFDA", True)
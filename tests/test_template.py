@@ -0,0 +1,266 @@
+import os
+import pytest
+import util
+from util import template
+
+
+TEMPLATES = [
+    "## {title}\n\nDear {name},\n\nyour total is **{total:.2f}**.",
+    "{n}. item\n{m}) other",
+    "1{n}. item",
+    "- {name}\n- [{name}](https://example.com/{slug})",
+    "{title}\n===\n\n    code {name}\n\n`{name}` and *{name}*",
+    "<div>{name}</div>\n\n{name!r} {{literal}} {name:>10}",
+    "{values[0]} {user.name}",
+    "{} positional",
+    "Visit <{url}>",
+    "Mail <{m}>",
+    "[foo][{a}]\n\n[b c]: http://x",
+    "[link]({url})",
+    "Report for **{a}**s",
+    "x_{a}_y",
+    "*{a}*_{m}_ and &#{n}",
+]
+
+VALUES = [
+    "Hello, World!", "Jane", "3", "", "  padded", "*bold*", "a_b_c",
+    "<b>x</b>", "Tom & Jerry", "line\nbreak", "2024-01-01", "O'Brien",
+    "https://example.com/a?b=c", "1.", "# heading", "http://example.com",
+    "jane@example.com", "b c", "Acme Inc.", "Oh!", "50%", "1; x",
+]
+
+
+class User:
+    name = "Ada"
+
+
+def _render_both(path, data, output_format):
+    expected = actual = None
+    try:
+        expected = util.fill_template(path, data, output_format, cache=False)
+    except (KeyError, IndexError, ValueError) as e:
+        expected = type(e)
+    try:
+        actual = util.fill_template(path, data, output_format)
+    except (KeyError, IndexError, ValueError) as e:
+        actual = type(e)
+    return expected, actual
+
+
+@pytest.mark.parametrize("text", TEMPLATES)
+@pytest.mark.parametrize("output_format", ["plain", "html"])
+def test_cached_render_matches_format(tmp_path, text, output_format):
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+    for value in VALUES:
+        data = {
+            "title": value, "name": value, "slug": value, "n": value,
+            "m": value, "url": value, "a": value, "total": 12.5,
+            "values": [value], "user": User(),
+        }
+        expected, actual = _render_both(path, data, output_format)
+        assert actual == expected, (text, value)
+
+
+def test_cached_html_matches_full_conversion():
+    import random
+    import markdown
+
+    rng = random.Random(0)
+    pieces = ["**", "*", "_", "x", " ", "[", "]", "(", "!", "<", "\n", "\n\n",
+              "# ", "1. ", "`", ".", "&", "#", "\\", "'"]
+    values = ["Acme Inc.", "Oh!", "50%", "Why?", "Jane", "a b", "O'Brien",
+              "x.y", "1 2", "j@x.com", "Hello, World!"]
+
+    for _ in range(300):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 4)))
+        text += "{a}" + "".join(rng.choice(pieces) for _ in range(rng.randint(0, 3)))
+        text += "{b}" + rng.choice(pieces)
+        data = {"a": rng.choice(values), "b": rng.choice(values)}
+
+        assert template.CompiledTemplate(text).render_html(data) == \
+            markdown.markdown(text.format(**data)), (text, data)
+
+
+def test_html_is_cached_for_plain_values(tmp_path, monkeypatch):
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("## {title}\n\nDear {name}")
+
+    util.fill_template(path, {"title": "Hi", "name": "Jane"})
+
+    import markdown
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("markdown should not run again")
+
+    monkeypatch.setattr(markdown, "markdown", forbidden)
+    assert util.fill_template(path, {"title": "Hello", "name": "Bob"}) == \
+        "<h2>Hello</h2>\n<p>Dear Bob</p>"
+
+
+def test_template_is_recompiled_when_changed(tmp_path):
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{a}")
+    first = template.get_template(path)
+    assert template.get_template(path) is first
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{a} and {b}")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert util.fill_template(path, {"a": 1, "b": 2}, "plain") == "1 and 2"
+
+    util.clear_template_cache(path)
+    assert template.get_template(path) is not first
+
+
+def test_fill_template_bulk(tmp_path):
+    import pandas as pd
+
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("## {name}\n\n{amount}")
+
+    df = pd.DataFrame({"name": ["Ann", "*Bob*"], "amount": [1, 2]}, index=[5, 7])
+    expected = [
+        util.fill_template(path, row, cache=False)
+        for row in df.to_dict("records")
+    ]
+
+    result = util.fill_template_bulk(path, df)
+    assert result.index.tolist() == [5, 7]
+    assert result.tolist() == expected
+
+    rows = ({"name": name, "amount": 0} for name in ["a", "b", "c"])
+    outputs = util.fill_template_bulk(path, rows, "plain", processes=2,
+                                      chunk_size=2)
+    assert list(outputs) == ["## a\n\n0", "## b\n\n0", "## c\n\n0"]
+
+
+def test_fill_template_bulk_errors(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        util.fill_template_bulk(str(tmp_path / "missing.md"), [])
+
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{name}")
+    with pytest.raises(KeyError):
+        list(util.fill_template_bulk(path, [{"other": 1}]))
+
+
+def test_safe_engine(tmp_path):
+    import pandas as pd
+
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "<style>p { color: red; }</style>\n\n"
+            "Dear {user.name|customer}, {greeting} {items.1} {missing|n/a} "
+            "{{literal}} {not a placeholder}"
+        )
+
+    data = {"user": {"name": "<Ann>"}, "greeting": "Hi", "items": ["a", "b"]}
+    assert util.fill_template(path, data, "plain", engine="safe") == (
+        "<style>p { color: red; }</style>\n\n"
+        "Dear <Ann>, Hi b n/a {literal} {not a placeholder}"
+    )
+
+    output = util.fill_template(path, data, engine="safe")
+    assert "<style>p { color: red; }</style>" in output
+    assert "Dear &lt;Ann&gt;, Hi b n/a" in output
+    assert util.fill_template(path, data, engine="safe", cache=False) == output
+
+    row = pd.Series({"greeting": "Hello", "items": ["x", "y"], "user": None})
+    assert util.fill_template(
+        path, row, "plain", engine="safe",
+        defaults={"user.name": "friend"}, cache=False,
+    ).endswith("Dear friend, Hello y n/a {literal} {not a placeholder}")
+
+
+def test_safe_engine_missing_value(tmp_path):
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{name}")
+
+    with pytest.raises(KeyError):
+        util.fill_template(path, {}, engine="safe")
+    assert util.fill_template(path, {"name": None}, "plain", engine="safe") == ""
+    assert util.fill_template_bulk(
+        path, [{}], "plain", engine="safe", defaults={"name": "x"},
+    ).__next__() == "x"
+
+
+STREAM_TEMPLATE = (
+    "# Report for {name}\n\n"
+    "Intro paragraph with **{name}**\nand a second line.\n\n"
+    "- first {a}\n\n- second\n\n    continued\n\n"
+    "1. one\n2. two\n\n"
+    "> quoted\n\n> more\n\n"
+    "    code {{not a field}}\n\n    more code\n\n"
+    "| a | b |\n|---|---|\n| {a} | 2 |\n\n"
+    "Closing\n===\n\n"
+    "Last paragraph.\n"
+)
+
+
+@pytest.mark.parametrize("output_format", ["plain", "html"])
+def test_stream_template_matches_fill_template(tmp_path, output_format):
+    import io
+
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(STREAM_TEMPLATE * 3)
+    data = {"name": "Ann", "a": "<x>"}
+
+    expected = util.fill_template(path, data, output_format, cache=False)
+    parts = list(util.stream_template(path, data, output_format, block_size=1))
+
+    assert len(parts) > 10
+    assert "".join(parts) == expected
+
+    output = io.StringIO()
+    written = util.stream_template(path, data, output_format, file=output)
+    assert output.getvalue() == expected
+    assert written == len(expected)
+
+
+def test_stream_template_keeps_html_blocks_together(tmp_path):
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<div>\n\n{a}\n\n</div>\n\nafter {b|x}\n")
+
+    parts = list(util.stream_template(
+        path, {"a": "1"}, engine="safe", block_size=1))
+    assert parts[0].startswith("<div>") and "</div>" in parts[0]
+    assert parts[-1] == "\n<p>after x</p>"
+
+    with pytest.raises(FileNotFoundError):
+        util.stream_template(str(tmp_path / "missing.md"))
+
+
+@pytest.mark.parametrize("output_format", ["plain", "html"])
+def test_stream_template_splits_long_tables_and_lists(tmp_path, output_format):
+    path = str(tmp_path / "template.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Totals for {name}\n\n| item | amount |\n|---|---|\n")
+        for i in range(300):
+            f.write(f"| *{i}* {{name}} | {i} |\n")
+        f.write("\n")
+        for i in range(300):
+            f.write(f"{i + 1}. {{name}} {i}\n")
+        f.write("\nEnd\n")
+    data = {"name": "Ann"}
+
+    expected = util.fill_template(path, data, output_format, cache=False)
+    blocks = list(template.iter_blocks(open(path, encoding="utf-8"), 1000))
+    parts = list(util.stream_template(path, data, output_format,
+                                      block_size=1000))
+
+    assert max(len(block) for block, _ in blocks) < 1100
+    assert {continued for _, continued in blocks} == {None, "p", "ol"}
+    assert "".join(parts) == expected
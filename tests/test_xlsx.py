@@ -0,0 +1,305 @@
+import os
+import zipfile
+import pandas as pd
+import pytest
+import util
+from util import xlsx
+
+
+def test_column_letters():
+    assert [xlsx.column_letter(i) for i in (0, 25, 26, 27, 701, 702)] == \
+        ["A", "Z", "AA", "AB", "ZZ", "AAA"]
+    assert xlsx.column_index("AAA") == 702
+
+
+def test_touch_excel_append(tmp_path):
+    path = str(tmp_path / "log.xlsx")
+    first = pd.DataFrame({
+        "id": [1, 2],
+        "name": ["a", "b"],
+        "value": [1.5, None],
+        "flag": [True, False],
+        "day": pd.to_datetime(["2024-01-01", "2024-01-02"]),
+    })
+    second = pd.DataFrame({
+        "id": [3],
+        "name": ["<c & d>"],
+        "value": [2.5],
+        "flag": [True],
+        "day": pd.to_datetime(["2024-01-03"]),
+    })
+
+    util.touch_excel(first, path, sheet_name="log")
+    util.touch_excel(pd.DataFrame({"x": [1]}), path, sheet_name="other")
+    util.touch_excel(second, path, sheet_name="log", append=True)
+
+    result = pd.read_excel(path, sheet_name="log")
+    expected = pd.concat([first, second], ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert pd.read_excel(path, sheet_name="other")["x"].tolist() == [1]
+
+    from openpyxl import load_workbook
+    assert load_workbook(path)["log"].dimensions == "A1:E4"
+
+
+def test_touch_excel_append_copies_other_parts(tmp_path):
+    path = str(tmp_path / "report.xlsx")
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"a": range(100)}).to_excel(writer, sheet_name="big", index=False)
+        pd.DataFrame({"a": [1]}).to_excel(writer, sheet_name="small", index=False)
+    with zipfile.ZipFile(path) as archive:
+        before = {info.filename: info for info in archive.infolist()}
+        big = archive.read("xl/worksheets/sheet1.xml")
+
+    util.touch_excel(pd.DataFrame({"a": [2]}), path, sheet_name="small", append=True)
+
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(before)
+        info = archive.getinfo("xl/worksheets/sheet1.xml")
+        assert (info.CRC, info.compress_size) == (
+            before[info.filename].CRC, before[info.filename].compress_size)
+        assert archive.read("xl/worksheets/sheet1.xml") == big
+    assert pd.read_excel(path, sheet_name="small")["a"].tolist() == [1, 2]
+
+
+def test_touch_excel_append_creates_missing_sheet(tmp_path):
+    path = str(tmp_path / "log.xlsx")
+    df = pd.DataFrame({"id": [1]})
+
+    util.touch_excel(df, path, sheet_name="log", append=True)
+    util.touch_excel(df, path, sheet_name="new", append=True)
+
+    assert pd.read_excel(path, sheet_name="new")["id"].tolist() == [1]
+
+
+def test_touch_excel_is_atomic(tmp_path, monkeypatch):
+    path = str(tmp_path / "report.xlsx")
+    util.touch_excel(pd.DataFrame({"a": [1]}), path, sheet_name="one")
+
+    def broken_to_excel(*args, **kwargs):
+        raise RuntimeError("crashed while writing")
+
+    monkeypatch.setattr(pd.DataFrame, "to_excel", broken_to_excel)
+    with pytest.raises(RuntimeError):
+        util.touch_excel(pd.DataFrame({"a": [2]}), path, sheet_name="one")
+    monkeypatch.undo()
+
+    assert pd.read_excel(path, sheet_name="one")["a"].tolist() == [1]
+    assert os.listdir(tmp_path) == ["report.xlsx"]
+
+
+def test_touch_excel_keeps_file_mode(tmp_path):
+    path = str(tmp_path / "report.xlsx")
+    util.touch_excel(pd.DataFrame({"a": [1]}), path, sheet_name="one")
+    os.chmod(path, 0o644)
+
+    util.touch_excel(pd.DataFrame({"a": [2]}), path, sheet_name="one")
+    assert os.stat(path).st_mode & 0o777 == 0o644
+
+    util.touch_excel(pd.DataFrame({"a": [3]}), path, sheet_name="one", append=True)
+    assert os.stat(path).st_mode & 0o777 == 0o644
+
+
+def test_touch_excel_lock(tmp_path):
+    from util.files import FileLock
+
+    path = str(tmp_path / "report.xlsx")
+    util.touch_excel(pd.DataFrame({"a": [1]}), path, lock=True)
+
+    with FileLock(path + ".lock"):
+        with pytest.raises(TimeoutError):
+            util.touch_excel(pd.DataFrame({"a": [2]}), path, lock=True, lock_timeout=0.1)
+
+    util.touch_excel(pd.DataFrame({"a": [3]}), path, lock=True, lock_timeout=1)
+    assert pd.read_excel(path)["a"].tolist() == [3]
+
+
+def test_touch_excel_sheets(tmp_path, monkeypatch):
+    from openpyxl import load_workbook
+
+    path = str(tmp_path / "report.xlsx")
+    util.touch_excel(pd.DataFrame({"keep": [0]}), path, sheet_name="kept")
+
+    from openpyxl.workbook.workbook import Workbook
+
+    saves = []
+    save = Workbook.save
+    monkeypatch.setattr(Workbook, "save", lambda self, path: saves.append(path) or save(self, path))
+
+    util.touch_excel_sheets(
+        {f"sheet{i}": pd.DataFrame({"column": [i]}) for i in range(5)},
+        path,
+        style=True,
+        header_color="FF0000",
+    )
+
+    assert len(saves) == 1
+    monkeypatch.undo()
+    workbook = load_workbook(path)
+    assert workbook.sheetnames == ["kept"] + [f"sheet{i}" for i in range(5)]
+    assert workbook["sheet3"]["A2"].value == 3
+    assert workbook["sheet3"]["A1"].font.bold
+    assert workbook["sheet3"]["A1"].fill.start_color.rgb.endswith("FF0000")
+
+
+def test_stream_excel_chunks(tmp_path):
+    path = str(tmp_path / "export.xlsx")
+    csv_path = tmp_path / "data.csv"
+    df = pd.DataFrame({
+        "id": range(2500),
+        "value": [i / 2 if i % 7 else None for i in range(2500)],
+        "day": pd.date_range("2024-01-01", periods=2500, freq="h"),
+    })
+    df.to_csv(csv_path, index=False)
+
+    chunks = pd.read_csv(csv_path, chunksize=1000, parse_dates=["day"])
+    assert util.stream_excel(chunks, path, sheet_name="data", style=True) == 2500
+
+    result = pd.read_excel(path, sheet_name="data")
+    pd.testing.assert_frame_equal(result, df, check_dtype=False)
+
+
+def test_stream_excel_single_dataframe(tmp_path):
+    path = str(tmp_path / "export.xlsx")
+    df = pd.DataFrame({"id": range(25)})
+
+    assert util.stream_excel(df, path, chunk_size=10) == 25
+    pd.testing.assert_frame_equal(pd.read_excel(path), df, check_dtype=False)
+
+
+def _header(path, sheet_name):
+    from openpyxl import load_workbook
+
+    worksheet = load_workbook(path)[sheet_name]
+    return [
+        (
+            cell.value,
+            cell.fill.fgColor.rgb,
+            cell.font.b,
+            cell.font.sz,
+            cell.border.left.style,
+            cell.number_format,
+            worksheet.column_dimensions[cell.column_letter].width,
+        )
+        for cell in worksheet[1]
+    ]
+
+
+def test_style_header_matches_openpyxl(tmp_path):
+    df = pd.DataFrame({
+        "id": [1, 2],
+        "a much longer name": ["x", "y"],
+        "day": pd.to_datetime(["2024-01-01", "2024-01-02"]),
+    })
+    patched, loaded = str(tmp_path / "patched.xlsx"), str(tmp_path / "loaded.xlsx")
+    for path in (patched, loaded):
+        with pd.ExcelWriter(path) as writer:
+            df.to_excel(writer, sheet_name="data", index=False)
+            df.to_excel(writer, sheet_name="other", index=False)
+
+    util.style_excel(patched, "data", header_color="FFAA00", font_size=14,
+                     header_only=True)
+    util.style_excel(loaded, "data", header_color="FFAA00", font_size=14)
+
+    assert _header(patched, "data") == _header(loaded, "data")
+    assert _header(patched, "data")[1][1:4] == ("00FFAA00", True, 14)
+    assert _header(patched, "other")[0][1] == "00000000"
+    pd.testing.assert_frame_equal(pd.read_excel(patched, sheet_name="data"), df)
+
+
+def test_style_header_is_idempotent(tmp_path):
+    path = str(tmp_path / "report.xlsx")
+    pd.DataFrame({"a": [1]}).to_excel(path, index=False)
+
+    util.style_excel(path, header_only=True)
+    with zipfile.ZipFile(path) as archive:
+        styles = archive.read("xl/styles.xml")
+    util.style_excel(path, header_only=True)
+    with zipfile.ZipFile(path) as archive:
+        assert archive.read("xl/styles.xml") == styles
+
+    assert _header(path, "Sheet1")[0][1] == "00D0EFFF"
+
+
+def test_style_header_keeps_other_column_widths(tmp_path):
+    from openpyxl import Workbook, load_workbook
+
+    path = str(tmp_path / "report.xlsx")
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(["a", "b", "c", "d"])
+    worksheet.column_dimensions.group("A", "D", hidden=False)
+    worksheet.column_dimensions["A"].width = 30
+    worksheet.column_dimensions["F"].width = 40
+    workbook.save(path)
+
+    util.style_excel(path, header_only=True)
+
+    worksheet = load_workbook(path).active
+    assert worksheet.column_dimensions["B"].width == 8.4
+    assert worksheet.column_dimensions["F"].width == 40
+
+
+def test_style_header_missing_sheet(tmp_path):
+    path = str(tmp_path / "report.xlsx")
+    pd.DataFrame({"a": [1]}).to_excel(path, index=False)
+
+    with pytest.raises(ValueError, match="Could not find sheet"):
+        util.style_excel(path, "missing", header_only=True)
+
+
+def test_column_widths():
+    df = pd.DataFrame({
+        "id": range(100),
+        "description": ["short"] * 99 + ["x" * 500],
+        "long header name": ["a"] * 100,
+        "ratio": [1 / 3] * 100,
+    })
+
+    widths = util.column_widths(df)
+
+    assert widths[0] == (5 + 2) * 1.2
+    # the single outlier is ignored by the quantile
+    assert widths[1] == (len("description") + 2) * 1.2
+    assert widths[2] == (len("long header name") + 2) * 1.2
+    assert widths[3] == (11 + 2) * 1.2
+    assert util.column_widths(df, quantile=1)[1] == (50 + 2) * 1.2
+
+
+def test_auto_width_in_writers(tmp_path):
+    from openpyxl import load_workbook
+
+    df = pd.DataFrame({"a": ["x" * 20, "y"], "b": [1, 2]})
+    expected = util.column_widths(df)
+
+    touched = str(tmp_path / "touched.xlsx")
+    streamed = str(tmp_path / "streamed.xlsx")
+    util.touch_excel(df, touched, sheet_name="data", auto_width=True)
+    util.touch_excel_sheets({"styled": df}, touched, style=True, auto_width=True)
+    util.stream_excel(df, streamed, auto_width=True)
+
+    workbook = load_workbook(touched)
+    for worksheet in (workbook["data"], workbook["styled"],
+                      load_workbook(streamed)["Sheet1"]):
+        assert [
+            worksheet.column_dimensions[letter].width for letter in "AB"
+        ] == expected
+
+
+def test_style_excel_auto_width(tmp_path):
+    from openpyxl import load_workbook
+
+    df = pd.DataFrame({"a": ["x" * 20] * 3, "b": [1, 2, 3]})
+    for header_only in (False, True):
+        path = str(tmp_path / f"{header_only}.xlsx")
+        df.to_excel(path, index=False)
+
+        util.style_excel(path, auto_width=True, header_only=header_only)
+
+        worksheet = load_workbook(path).active
+        assert worksheet.column_dimensions["A"].width == (20 + 2) * 1.2
+        assert worksheet.column_dimensions["B"].width == (5 + 2) * 1.2
+
+    with pytest.raises(ValueError, match="Could not find sheet"):
+        util.style_excel(path, "missing", auto_width=True, header_only=True)
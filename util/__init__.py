@@ -7,23 +7,38 @@ of different projects within the organization.
 """
 
 import os
-import ssl
+import sys
+import math
 import time
-import json
+import atexit
 import smtplib
 import warnings
+import threading
 from enum import Enum
+from contextvars import ContextVar
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Iterable, NamedTuple
 from pathlib import Path
 from email.utils import COMMASPACE
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-import yaml
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill, Font, Side, Border
-import win32com.client as win32
-import markdown
+from util import smtp_pool, outlook, styles
+from util.rate_limit import get_bucket
+from util.attachments import attachment_part
+from util.circuit_breaker import CircuitBreaker
+from util.files import FileLock, atomic_path, ensure_writable
+from util.styles import register_header_style, get_header_style
+from util.template import get_template, clear_template_cache, SafeTemplate
+from util.config import config_path as _get_config_path
+from util.config import load_config, parse_config, freeze, invalidate_config
+from util.config import get_layered_config
+
+# Heavy dependencies (pandas, openpyxl, yaml, markdown, win32com and sqlite3)
+# are imported inside the functions needing them, so `import util` stays
+# cheap for scripts that only send mails or read configs.
+if TYPE_CHECKING:
+    import pandas as pd
+    from util.mail_queue import MailQueue
 
 
 # pylint: disable=R0913
@@ -35,12 +50,40 @@ smtp_username: str | None = None
 smtp_password: str | None = None
 smtp_api_key: str | None = None
 smtp_from: str = 'alan.baker@imarcgroup.info'
+smtp_rate: float = 1.0
+smtp_burst: int = 1
+smtp_rate_shared: bool = True
+
+mail_queue_path: str = os.path.join(
+    os.path.expanduser('~'), ".util_mail_queue.sqlite3")
+mail_queue_modes: list["EmailMode"] | None = None
+# seconds spent at interpreter exit delivering mails queued by this process,
+# 0 leaves them to the next process using the queue
+mail_queue_exit_timeout: float = 30.0
+
+# modes of a fallback chain that failed this many times in a row are
+# skipped for mode_cooldown seconds
+mode_failure_threshold: int = 3
+mode_cooldown: float = 300.0
+
+_mode_breakers: dict = {}
+_mode_breakers_lock = threading.Lock()
+
+_mail_queue: "MailQueue | None" = None
+_mail_queue_lock = threading.Lock()
+
+# SMTP replies asking the client to slow down
+_THROTTLE_CODES = (421, 451)
+
+# errors caused by the arguments of a mail, which every mode raises again
+_INPUT_ERRORS = (FileNotFoundError, IsADirectoryError, ValueError, TypeError)
 
 
 class EmailMode(Enum):
     """Enum for email modes."""
     OUTLOOK="outlook"
     API="api"
+    QUEUED="queued"
 
 
 class TemplateFormat(Enum):
@@ -53,6 +96,11 @@ class TemplateOutputFormat(Enum):
     HTML="html"
 
 
+class TemplateEngine(Enum):
+    FORMAT="format"
+    SAFE="safe"
+
+
 def _outlook_mailing(
         subject: str,
         message: str,
@@ -63,36 +111,50 @@ def _outlook_mailing(
         bcc: list[str] = None,
 ):
 
-    outlook = win32.Dispatch('outlook.application')
+    outlook.send(
+        subject = subject,
+        message = message,
+        recipients = recipients,
+        mail_type = mail_type,
+        attachments = attachments,
+        cc = cc,
+        bcc = bcc,
+    )
 
-    # for email in recipients:
-    mail = outlook.CreateItem(0)
 
-    # mail.To = str(email)
-    mail.To = ";".join(recipients)
-    if cc:
-        mail.CC = ";".join(cc)
+def _smtp_credentials() -> tuple[str, str]:
+    "returns the (username, password) pair used to log in to the smtp host"
+    if (
+        smtp_api_key is None
+        and (smtp_username is None
+                and smtp_password is None)
+    ):
+        raise ValueError(
+            "Please provide either an smtp_api_key or "
+            "(smtp_username and smtp_password)")
 
-    if bcc:
-        mail.BCC = ";".join(bcc)
+    if smtp_api_key:
+        return 'apikey', smtp_api_key
+    return smtp_username, smtp_password
 
-    mail.Subject = str(subject)
 
-    if attachments:
-        mail.attachments = attachments
+# (rate, burst) of `send_mail_batch`, overriding smtp_rate and smtp_burst
+_rate_override: ContextVar[tuple[float, int] | None] = ContextVar(
+    "_rate_override", default=None)
 
-    if mail_type == "plain":
-        mail.Body = str(message)
-    elif mail_type == "html":
-        mail.HTMLBody = str(message)
-    else:
-        raise ValueError(
-            "Invalid mail type. Choose 'plain' or 'html'.")
 
-    mail.Send()
+def _smtp_bucket():
+    "returns the token bucket rate limiting the configured smtp host"
+    rate, burst = _rate_override.get() or (smtp_rate, smtp_burst)
+    return get_bucket(
+        f"smtp-{smtp_host}-{smtp_port}",
+        rate = rate,
+        burst = burst,
+        shared = smtp_rate_shared,
+    )
 
 
-def _api_mailing(
+def _build_message(
         subject: str,
         message: str,
         recipients: list[str],
@@ -100,24 +162,21 @@ def _api_mailing(
         attachments: list[str] = None,
         cc: list[str] = None,
         bcc: list[str] = None,
-):
-    if (
-        smtp_api_key is None
-        and (smtp_username is None
-                and smtp_password is None)
-    ):
-        raise ValueError(
-            "Please provide either an smtp_api_key or "
-            "(smtp_username and smtp_password)")
+) -> tuple[MIMEMultipart, list[str]]:
+    """builds the MIME message
 
-    mail_from = smtp_from
+    Returns:
+        tuple[MIMEMultipart, list[str]]: the message and every address it
+            has to be delivered to, including cc and bcc
+    """
+    recipients = list(recipients)
 
     # for email in recipients:
     # mail_to = str(email)
 
     msg = MIMEMultipart()
 
-    msg['From'] = mail_from
+    msg['From'] = smtp_from
     msg['To'] = COMMASPACE.join(recipients)
 
     if cc:
@@ -134,34 +193,176 @@ def _api_mailing(
     msg.attach(html_part)
 
     for file_path in attachments or []:
-        with open(file_path, "rb") as file:
-            part = MIMEApplication(
-                file.read(),
-                Name=os.path.basename(file_path)
+        msg.attach(attachment_part(file_path))
+
+    return msg, recipients
+
+
+def _api_mailing(
+        subject: str,
+        message: str,
+        recipients: list[str],
+        mail_type: str = "plain",
+        attachments: list[str] = None,
+        cc: list[str] = None,
+        bcc: list[str] = None,
+):
+    username, password = _smtp_credentials()
+
+    msg, recipients = _build_message(
+        subject = subject,
+        message = message,
+        recipients = recipients,
+        mail_type = mail_type,
+        attachments = attachments,
+        cc = cc,
+        bcc = bcc,
+    )
+
+    bucket = _smtp_bucket()
+    bucket.acquire()
+
+    try:
+        smtp_pool.get_pool().sendmail(
+            smtp_host,
+            smtp_port,
+            username,
+            password,
+            msg['From'],
+            recipients,
+            msg,
+        )
+    except smtplib.SMTPRecipientsRefused as e:
+        if any(code in _THROTTLE_CODES for code, _ in e.recipients.values()):
+            bucket.backoff()
+        raise
+    except smtplib.SMTPResponseException as e:
+        if e.smtp_code in _THROTTLE_CODES:
+            bucket.backoff()
+        raise
+
+    bucket.recover()
+
+
+class MailResult(NamedTuple):
+    """Outcome of one message sent by `send_mail_batch`."""
+    index: int
+    success: bool
+    error: Exception | None = None
+
+
+def _mode_breaker(mode: EmailMode) -> CircuitBreaker:
+    "returns the circuit breaker tracking the health of ``mode``"
+    with _mode_breakers_lock:
+        if mode not in _mode_breakers:
+            _mode_breakers[mode] = CircuitBreaker(
+                failure_threshold = mode_failure_threshold,
+                cooldown = mode_cooldown,
             )
-        # After the file is closed
-        part['Content-Disposition'] = 'attachment; '\
-            f'filename="{os.path.basename(file_path)}"'
-        msg.attach(part)
-
-    if smtp_port == 587:
-        context = ssl.create_default_context()
-        server = smtplib.SMTP(smtp_host, smtp_port)
-        server.starttls(context=context)
-    else:
-        server = smtplib.SMTP_SSL(smtp_host, smtp_port)
+        return _mode_breakers[mode]
 
-    server.ehlo()
 
-    if smtp_api_key:
-        server.login('apikey', smtp_api_key)
-    else:
-        server.login(smtp_username, smtp_password)
+def _modes_to_try(modes: list[EmailMode]):
+    """yields the modes of a fallback chain that are worth trying
+
+    Modes whose breaker is open are skipped. If that would skip every mode,
+    they are all tried anyway, so a mail is never dropped only because each
+    mode failed recently. The generator is lazy, so a probe slot is only
+    taken when the previous mode actually failed.
+    """
+    skipped = []
+    attempted = False
+
+    for mode_ in modes:
+        if _mode_breaker(mode_).allow():
+            attempted = True
+            yield mode_
+        else:
+            skipped.append(mode_)
+
+    if not attempted:
+        yield from skipped
+
+
+def get_mode_health() -> dict[str, dict]:
+    """returns the circuit breaker stats of every mode used in a fallback chain
+
+    Returns:
+        dict[str, dict]: stats (state, failures, successes, skipped, ...)
+            keyed by the mode value
+    """
+    with _mode_breakers_lock:
+        breakers = dict(_mode_breakers)
+
+    return {mode.value: breaker.stats() for mode, breaker in breakers.items()}
+
+
+def reset_mode_health():
+    "forgets the failure history of every mode"
+    with _mode_breakers_lock:
+        _mode_breakers.clear()
+
 
-    server.sendmail(mail_from, recipients, msg.as_string())
-    server.close()
+def _check_mail(mail_type: str, attachments: list[str] | None):
+    "raises the errors of invalid arguments before any mode is tried"
+    if mail_type not in ("plain", "html"):
+        raise ValueError("Invalid mail type. Choose 'plain' or 'html'.")
+    for path in attachments or []:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Attachment not found: {path}")
 
-    time.sleep(1)
+
+def _send_with_fallback(
+        subject: str,
+        message: str,
+        recipients: list[str],
+        mail_type: str = "plain",
+        attachments: list[str] = None,
+        modes: list[EmailMode] = None,
+        cc: list[str] = None,
+        bcc: list[str] = None,
+):
+    """tries every mode in order until one succeeds
+
+    Only failures of a mode itself, e.g. SMTP or COM errors, count against
+    its circuit breaker. Invalid arguments are raised right away.
+
+    Raises:
+        FileNotFoundError: If an attachment does not exist.
+        ValueError: If mail_type is neither 'plain' nor 'html'.
+        Exception: the error of the last mode when none of them succeeded.
+    """
+    _check_mail(mail_type, attachments)
+    error = ValueError("No email mode provided.")
+
+    for mode_ in _modes_to_try(modes):
+        breaker = _mode_breaker(mode_)
+        try:
+            send_mail(
+                subject = subject,
+                message = message,
+                recipients = recipients,
+                mail_type = mail_type,
+                attachments = attachments,
+                mode = mode_,
+                cc = cc,
+                bcc = bcc,
+            )
+
+        except _INPUT_ERRORS:
+            raise
+
+        # pylint: disable-next=W0718
+        except Exception as e:
+            breaker.record_failure()
+            error = e
+            warnings.warn(f"Failed to send mail via '{mode_}' mode.")
+            continue
+
+        breaker.record_success()
+        return
+
+    raise error
 
 
 def send_mail(
@@ -208,34 +409,232 @@ def send_mail(
             bcc = bcc,
         )
 
+    elif mode == EmailMode.QUEUED:
+        get_mail_queue().put(
+            subject = subject,
+            message = message,
+            recipients = list(recipients),
+            mail_type = mail_type,
+            attachments = [os.path.abspath(path) for path in attachments or []],
+            cc = cc,
+            bcc = bcc,
+        )
+
     elif isinstance(mode, list):
-        for mode_ in mode:
-            try:
-                send_mail(
-                    subject = subject,
-                    message = message,
-                    recipients = recipients,
-                    mail_type = mail_type,
-                    attachments = attachments,
-                    mode = mode_,
-                    cc = cc,
-                    bcc = bcc,
-                )
-                break
-
-            # pylint: disable-next=W0718
-            except Exception:
-                warnings.warn("Failed to send mail via '{mode_}' mode.")
+        try:
+            _send_with_fallback(
+                subject = subject,
+                message = message,
+                recipients = recipients,
+                mail_type = mail_type,
+                attachments = attachments,
+                modes = mode,
+                cc = cc,
+                bcc = bcc,
+            )
+        # pylint: disable-next=W0718
+        except Exception:
+            pass
 
     else:
-        raise ValueError("Invalid email mode. Choose 'outlook' or 'api'.")
+        raise ValueError(
+            "Invalid email mode. Choose 'outlook', 'api' or 'queued'.")
+
+
+def _send_queued_mail(**mail):
+    "sends a mail taken from the queue, raising if every mode failed"
+    modes = mail_queue_modes or [EmailMode.OUTLOOK, EmailMode.API]
+    if EmailMode.QUEUED in modes:
+        raise ValueError("mail_queue_modes must not contain EmailMode.QUEUED")
+
+    _send_with_fallback(modes=modes, **mail)
+
+
+def get_mail_queue() -> "MailQueue":
+    """returns the durable mail queue, starting its worker on first use
+
+    Mails sent with `EmailMode.QUEUED` are stored at `mail_queue_path` and
+    delivered in the background through `mail_queue_modes`, which defaults
+    to Outlook with the API as fallback.
+    """
+    global _mail_queue  # pylint: disable=W0603
+    # pylint: disable-next=C0415
+    from util.mail_queue import MailQueue
+
+    with _mail_queue_lock:
+        if _mail_queue is None or _mail_queue.path != mail_queue_path:
+            if _mail_queue is not None:
+                _mail_queue.stop_worker()
+            else:
+                atexit.register(_flush_mail_queue_at_exit)
+            _mail_queue = MailQueue(mail_queue_path, sender=_send_queued_mail)
+            _mail_queue.start_worker()
+        return _mail_queue
+
+
+def flush_mail_queue(timeout: float | None = None) -> int:
+    """sends every due mail of the queue at `mail_queue_path` in this thread
+
+    For scripts and scheduled jobs that deliver what earlier processes
+    queued, without starting the background worker.
+
+    Args:
+        timeout (float, optional): seconds after which no further mail is
+            started. Defaults to None, which sends every due mail.
+
+    Returns:
+        int: number of processed mails, sent or failed
+    """
+    # pylint: disable-next=C0415
+    from util.mail_queue import MailQueue
+
+    with _mail_queue_lock:
+        queue = _mail_queue
+    if queue is None or queue.path != mail_queue_path:
+        queue = MailQueue(mail_queue_path, sender=_send_queued_mail)
+    return queue.drain(timeout)
+
+
+def _flush_mail_queue_at_exit():
+    "delivers what the daemon worker left, for at most mail_queue_exit_timeout"
+    queue = _mail_queue
+    if queue is None or not mail_queue_exit_timeout:
+        return
+
+    deadline = time.monotonic() + mail_queue_exit_timeout
+    queue.stop_worker(mail_queue_exit_timeout)
+    try:
+        queue.drain(max(0.0, deadline - time.monotonic()))
+        pending = queue.pending()
+    # pylint: disable-next=W0718
+    except Exception:
+        return
+
+    if pending:
+        warnings.warn(
+            f"{pending} queued mails are not sent yet. They are sent by the "
+            "next process using the mail queue, or by util.flush_mail_queue().")
+
+
+def send_mail_batch(
+        messages: Iterable[dict],
+        mode: EmailMode | list[EmailMode] = EmailMode.API,
+        max_workers: int = 4,
+        rate: float | None = None,
+        burst: int | None = None,
+) -> list[MailResult]:
+    """sends many mails concurrently
+
+    Every message is a dict with the keyword arguments of `send_mail`
+    (`subject`, `message`, `recipients` and optionally `mail_type`,
+    `attachments`, `cc` and `bcc`). Messages are dispatched by a bounded
+    pool of worker threads which share the pooled SMTP sessions, so a
+    failing message never stops the others.
+
+    API sends still go through the smtp rate limit, which defaults to one
+    message per second with `smtp_rate` and `smtp_burst`. More workers only
+    send faster with a higher ``rate`` (or ``util.smtp_rate``).
+
+    With ``mode=EmailMode.OUTLOOK`` the messages are sent one after the
+    other from the calling thread over its Outlook application object, see
+    `outlook.send_many`, since Outlook handles one mail at a time anyway.
+
+    Args:
+        messages (Iterable[dict]): the messages to send
+        mode (EmailMode | list[EmailMode], optional): mode or fallback
+            chain used for every message. Defaults to EmailMode.API.
+        max_workers (int, optional): number of messages in flight at
+            once, unused for Outlook. Defaults to 4.
+        rate (float, optional): messages per second allowed for this
+            batch. Defaults to `smtp_rate`.
+        burst (int, optional): messages of this batch that may be sent back
+            to back. Defaults to `smtp_burst`.
+
+    Returns:
+        list[MailResult]: one result per message, in input order
+    """
+    if mode == EmailMode.OUTLOOK:
+        errors = outlook.send_many(messages)
+        return [
+            MailResult(index, error is None, error)
+            for index, error in enumerate(errors)
+        ]
+
+    limits = None
+    if rate is not None or burst is not None:
+        limits = (
+            smtp_rate if rate is None else rate,
+            smtp_burst if burst is None else burst,
+        )
+
+    def _send(index: int, spec: dict) -> MailResult:
+        # worker threads start with an empty context
+        token = _rate_override.set(limits)
+        try:
+            if isinstance(mode, list):
+                _send_with_fallback(modes=mode, **spec)
+            else:
+                send_mail(mode=mode, **spec)
+        # pylint: disable-next=W0718
+        except Exception as e:
+            return MailResult(index, False, e)
+        finally:
+            _rate_override.reset(token)
+        return MailResult(index, True)
+
+    # pylint: disable-next=C0415
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_send, index, spec)
+            for index, spec in enumerate(messages)
+        ]
+        return [future.result() for future in futures]
+
+
+def _write_sheets(
+    file_path: str,
+    sheets: dict[str, "pd.DataFrame"],
+    style: dict | None = None,
+    auto_width: bool = False,
+):
+    """writes every DataFrame of ``sheets`` in a single open/save cycle
+
+    Existing sheets with the same names are replaced, other sheets are kept.
+    With ``style`` the header of every written sheet is styled with those
+    `_style_header` arguments before the workbook is saved. With
+    ``auto_width`` the columns are sized by `column_widths` of the DataFrame.
+    """
+    # pylint: disable-next=C0415
+    import pandas as pd
+
+    exists = os.path.exists(file_path)
+    writer_args = {"mode": "a", "if_sheet_exists": "replace"} if exists else {}
+
+    with atomic_path(file_path, copy_existing=exists) as temp_path:
+        with pd.ExcelWriter(temp_path, engine='openpyxl', **writer_args) as writer:
+            for sheet_name, df in sheets.items():
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+                worksheet = writer.sheets[sheet_name]
+                widths = column_widths(df) if auto_width else None
+
+                if style is not None:
+                    _style_header(worksheet, widths=widths, **style)
+                elif widths is not None:
+                    _apply_widths(worksheet, widths)
 
 
 def touch_excel(
-    df: pd.DataFrame,
+    df: "pd.DataFrame",
     file_path: str | Path,
     sheet_name: str = "Sheet1",
-    add_df: pd.DataFrame = None,
+    add_df: "pd.DataFrame" = None,
+    append: bool = False,
+    lock: bool = False,
+    lock_timeout: float | None = None,
+    auto_width: bool = False,
 ):
     """this function updates or creates a new sheet with the given dataframe
 
@@ -244,6 +643,18 @@ def touch_excel(
     It can also concatenate two different DataFrames and merge them into one
     them write them in the given sheet
 
+    With `append` the rows are added below the last used row of an existing
+    sheet instead of replacing it. The existing rows are not loaded into
+    openpyxl, and the other parts of the workbook are copied without being
+    recompressed. The XML of the target sheet is still inflated, patched and
+    compressed again, so the cost grows with the size of that sheet, at
+    roughly a second per million cells. Columns are written in the order of
+    the DataFrame, without a header.
+
+    The workbook is written to a temporary file next to it which then
+    atomically replaces the original, so a crash never leaves a half
+    written file behind.
+
     Args:
         df (pd.DataFrame): 
             dataframe that is to be written to the sheet
@@ -257,40 +668,314 @@ def touch_excel(
         add_df (pd.DataFrame, optional): 
             other dataframe that is to be merged. Defaults to None.
 
+        append (bool, optional): 
+            append the rows to the existing sheet. Defaults to False.
+
+        lock (bool, optional): 
+            serialize concurrent writers, also across processes, with a
+            "<file_path>.lock" file. Defaults to False.
+
+        lock_timeout (float, optional): 
+            seconds to wait for the lock. Waits forever when None.
+
+        auto_width (bool, optional): 
+            size the columns to the header and the values of the DataFrame,
+            see `column_widths`. Ignored when appending. Defaults to False.
+
     Raises:
         PermissionError: 
             When the file is opened by user and is currently being used. 
             Please Close the file
+
+        TimeoutError: 
+            When the lock could not be acquired within lock_timeout.
     """
+    # pylint: disable-next=C0415
+    import pandas as pd
+    # pylint: disable-next=C0415
+    from util import xlsx
+
     if isinstance(file_path, Path):
         file_path = str(file_path)
 
     if add_df is not None:
         df = pd.concat([df, add_df], ignore_index=True)
 
+    if lock:
+        file_lock = FileLock(f"{file_path}.lock", timeout=lock_timeout)
+    else:
+        file_lock = nullcontext()
+
     try:
-        if not os.path.exists(file_path):
-            df.to_excel(file_path, sheet_name=sheet_name, index=False)
-        else:
-            with pd.ExcelWriter(
-                file_path,
-                mode="a",
-                engine='openpyxl',
-                if_sheet_exists='replace',
-            ) as writer:
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                time.sleep(5)
-                # writer.close()
+        with file_lock:
+            ensure_writable(file_path)
+
+            if (
+                append
+                and os.path.exists(file_path)
+                and xlsx.has_sheet(file_path, sheet_name)
+            ):
+                try:
+                    xlsx.append_rows(
+                        file_path,
+                        sheet_name,
+                        df.itertuples(index=False, name=None),
+                        len(df.columns),
+                    )
+                except xlsx.XlsxPatchError:
+                    with atomic_path(file_path, copy_existing=True) as temp_path:
+                        with pd.ExcelWriter(
+                            temp_path,
+                            mode="a",
+                            engine='openpyxl',
+                            if_sheet_exists='overlay',
+                        ) as writer:
+                            df.to_excel(
+                                writer,
+                                sheet_name=sheet_name,
+                                index=False,
+                                header=False,
+                                startrow=writer.sheets[sheet_name].max_row,
+                            )
+            else:
+                _write_sheets(file_path, {sheet_name: df}, auto_width=auto_width)
+    except PermissionError as e:
+        e.message = "File might be open. Close it."
+        raise e
+
+
+def touch_excel_sheets(
+    sheets: dict[str, "pd.DataFrame"],
+    file_path: str | Path,
+    style: bool = False,
+    header_color: str = 'D0EFFF',
+    bold: bool = True,
+    font_size: int = None,
+    lock: bool = False,
+    lock_timeout: float | None = None,
+    auto_width: bool = False,
+    preset: str | None = None,
+):
+    """updates or creates several sheets of a workbook at once
+
+    Unlike calling `touch_excel` once per sheet, the workbook is loaded and
+    saved only once, however many sheets are written. Sheets not in
+    `sheets` are kept as they are.
+
+    Args:
+        sheets (dict[str, pd.DataFrame]): 
+            DataFrame to write for every sheet name
+
+        file_path (string): 
+            path to the file to be written. Created if it does not exist.
+
+        style (bool, optional): 
+            apply the `style_excel` header formatting in the same pass.
+            Defaults to False.
+
+        header_color (str, optional): 
+            header color used when styling. Defaults to 'D0EFFF'.
+
+        bold (bool, optional): 
+            bold headers when styling. Defaults to True.
+
+        font_size (int, optional): 
+            header font size when styling. Defaults to None.
+
+        lock (bool, optional): 
+            serialize concurrent writers with a "<file_path>.lock" file.
+            Defaults to False.
+
+        lock_timeout (float, optional): 
+            seconds to wait for the lock. Waits forever when None.
+
+        auto_width (bool, optional): 
+            size the columns to the header and the values of every
+            DataFrame, see `column_widths`. Defaults to False.
+
+        preset (str, optional): 
+            name of a registered header style to style with, see
+            `register_header_style`. Implies style. Defaults to None.
+
+    Raises:
+        PermissionError: 
+            When the file is opened by user and is currently being used. 
+            Please Close the file
+    """
+    if isinstance(file_path, Path):
+        file_path = str(file_path)
+
+    style_args = None
+    if preset:
+        styles.get_header_style(preset)
+        style_args = {"preset": preset}
+    elif style:
+        style_args = {
+            "header_color": header_color,
+            "bold": bold,
+            "font_size": font_size,
+        }
+
+    if lock:
+        file_lock = FileLock(f"{file_path}.lock", timeout=lock_timeout)
+    else:
+        file_lock = nullcontext()
+
+    try:
+        with file_lock:
+            ensure_writable(file_path)
+            _write_sheets(
+                file_path, sheets, style=style_args, auto_width=auto_width)
+    except PermissionError as e:
+        e.message = "File might be open. Close it."
+        raise e
+
+
+def stream_excel(
+    chunks: "pd.DataFrame | Iterable[pd.DataFrame]",
+    file_path: str | Path,
+    sheet_name: str = "Sheet1",
+    style: bool = False,
+    header_color: str = 'D0EFFF',
+    bold: bool = True,
+    font_size: int = None,
+    chunk_size: int = 10_000,
+    auto_width: bool = False,
+    preset: str | None = None,
+) -> int:
+    """writes a large dataset to a new workbook with flat memory usage
+
+    Rows are streamed into a write-only openpyxl workbook, so no cell objects
+    are kept in memory. `chunks` may be a single DataFrame or any iterable
+    of DataFrames, e.g. `pd.read_csv(path, chunksize=...)`, which allows
+    exporting data that does not fit into memory. The header is taken from
+    the first chunk.
+
+    The file is always created from scratch. An existing file at
+    `file_path` is replaced once the export finished successfully.
+
+    Args:
+        chunks (pd.DataFrame | Iterable[pd.DataFrame]): 
+            data to write
+
+        file_path (string): 
+            path to the file to be written
+
+        sheet_name (string, optional): 
+            name of the sheet. Defaults to "Sheet1".
+
+        style (bool, optional): 
+            apply the `style_excel` header formatting. Defaults to False.
+
+        header_color (str, optional): 
+            header color used when styling. Defaults to 'D0EFFF'.
+
+        bold (bool, optional): 
+            bold headers when styling. Defaults to True.
+
+        font_size (int, optional): 
+            header font size when styling. Defaults to None.
+
+        chunk_size (int, optional): 
+            rows converted at once when a single DataFrame is given.
+            Defaults to 10_000.
+
+        auto_width (bool, optional): 
+            size the columns to the header and the values of the first
+            chunk, see `column_widths`. Defaults to False.
+
+        preset (str, optional): 
+            name of a registered header style to style with, see
+            `register_header_style`. Implies style. Defaults to None.
+
+    Returns:
+        int: number of data rows written
+
+    Raises:
+        PermissionError: 
+            When the file is opened by user and is currently being used. 
+            Please Close the file
+    """
+    # pylint: disable-next=C0415
+    import pandas as pd
+    # pylint: disable-next=C0415
+    from openpyxl import Workbook
+    # pylint: disable-next=C0415
+    from openpyxl.cell import WriteOnlyCell
+
+    if isinstance(file_path, Path):
+        file_path = str(file_path)
+
+    if isinstance(chunks, pd.DataFrame):
+        df = chunks
+        chunks = (
+            df.iloc[start:start + chunk_size]
+            for start in range(0, max(len(df), 1), chunk_size)
+        )
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    rows = 0
+    header_written = False
+
+    for chunk in chunks:
+        if not header_written:
+            header = [str(column) for column in chunk.columns]
+
+            if auto_width:
+                # write-only sheets need their widths before the first row
+                _apply_widths(worksheet, column_widths(chunk))
+
+            if preset:
+                style_name = styles.named_style(workbook, preset)
+
+                cells = []
+                for value in header:
+                    cell = WriteOnlyCell(worksheet, value=value)
+                    cell.style = style_name
+                    cells.append(cell)
+                header = cells
+
+            elif style:
+                fill, font, border = _header_styles(
+                    header_color, bold, font_size)
+
+                cells = []
+                for value in header:
+                    cell = WriteOnlyCell(worksheet, value=value)
+                    cell.fill = fill
+                    cell.font = font
+                    cell.border = border
+                    cells.append(cell)
+                header = cells
+
+            worksheet.append(header)
+            header_written = True
+
+        # openpyxl cannot store NaN, NaT or NA
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            worksheet.append(row)
+        rows += len(chunk)
+
+    try:
+        ensure_writable(file_path)
+        with atomic_path(file_path) as temp_path:
+            workbook.save(temp_path)
     except PermissionError as e:
         e.message = "File might be open. Close it."
         raise e
 
+    return rows
+
 
 def get_config(
     file_name: str,
     is_global: bool = False,
     file_type: str = "json",
     encoding: str = "utf-8",
+    cache: bool = True,
+    readonly: bool = False,
 ) -> dict:
     """
     Load configuration from a specified JSON or YAML file.
@@ -310,6 +995,11 @@ def get_config(
             either 'json' or 'yaml'. Defaults to 'json'.
         encoding (str, optional): The encoding to use when opening the file.
             Defaults to 'utf-8'.
+        cache (bool, optional): Reuse the parsed file until it changes on
+            disk. See `invalidate_config`. Defaults to True.
+        readonly (bool, optional): Return a shared read-only view of the
+            cached configuration instead of a private copy, which avoids
+            copying it on every call. Defaults to False.
 
     Returns:
         dict: A dictionary containing the loaded configurations.
@@ -319,37 +1009,190 @@ def get_config(
             location.
         ValueError: If the file_type is neither 'json' nor 'yaml'.
     """
-    if is_global:
-        base_path = os.path.join(
-            os.path.expanduser('~'), "Project Configurations")
-    else:
-        base_path = os.getcwd()
-
-    config_path = os.path.join(
-        base_path,
-        file_name,
-    )
+    config_path = _get_config_path(file_name, is_global)
 
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"{file_name} Not found at {config_path}")
 
-    with open(config_path, 'r', encoding=encoding) as f:
-        if file_type == "json":
-            config = json.load(f)
-        elif file_type == "yaml":
-            config = yaml.load(f.read(), Loader=yaml.FullLoader)
-        else:
-            raise ValueError(f"File type {file_type} not supported")
+    if not cache:
+        config = parse_config(config_path, file_type, encoding)
+        return freeze(config) if readonly else config
+
+    config = load_config(config_path, file_type, encoding, readonly=readonly)
 
     return config
 
 
+def column_widths(
+    df: "pd.DataFrame",
+    sample_size: int = 10_000,
+    quantile: float = 0.95,
+    max_width: int = 50,
+) -> list[float]:
+    """computes Excel column widths fitting the header and the values
+
+    The length of the values is measured on a random sample of at most
+    `sample_size` rows with vectorized pandas string operations, so the
+    cost does not grow with the size of the DataFrame. Each column fits its
+    header and the `quantile` of the value lengths, so a few outliers do
+    not blow up the width. Numbers count at most 11 characters, which is
+    what Excel displays in the General format.
+
+    Args:
+        df (pd.DataFrame): 
+            data that is written to the sheet
+
+        sample_size (int, optional): 
+            rows measured at most. Defaults to 10_000.
+
+        quantile (float, optional): 
+            quantile of the value lengths to fit. Defaults to 0.95.
+
+        max_width (int, optional): 
+            characters the values can widen a column to at most. Longer
+            headers are always fitted. Defaults to 50.
+
+    Returns:
+        list[float]: the width of every column, in column order
+    """
+    # pylint: disable-next=C0415
+    import pandas as pd
+
+    if len(df) > sample_size:
+        df = df.sample(sample_size, random_state=0)
+
+    widths = []
+    for position, column in enumerate(df.columns):
+        values = df.iloc[:, position].dropna()
+        length = len(str(column))
+
+        if len(values):
+            lengths = values.astype(str).str.len()
+            if (
+                pd.api.types.is_numeric_dtype(values)
+                and not pd.api.types.is_bool_dtype(values)
+            ):
+                lengths = lengths.clip(upper=11)
+            value_length = math.ceil(lengths.quantile(quantile))
+            length = max(length, min(value_length, max_width))
+
+        widths.append((max(5, length) + 2) * 1.2)
+
+    return widths
+
+
+def _sample_widths(worksheet, sample_rows: int = 1000) -> list[float]:
+    "runs `column_widths` on the header and the first rows of a worksheet"
+    # pylint: disable-next=C0415
+    import pandas as pd
+
+    rows = worksheet.iter_rows(max_row=sample_rows + 1, values_only=True)
+    header = next(rows, ())
+    sample = pd.DataFrame(list(rows), columns=range(len(header)))
+    sample.columns = [str(value) for value in header]
+    return column_widths(sample.infer_objects())
+
+
+def _sample_sheet_widths(
+    path: str,
+    sheet_names: list[str] | None,
+    sample_rows: int = 1000,
+) -> dict[str, list[float]]:
+    """runs `_sample_widths` on sheets of a workbook opened read-only
+
+    A read-only workbook parses rows lazily, so only the sampled rows are
+    read from the file.
+
+    Raises:
+        KeyError: If the workbook has no sheet with one of the names.
+    """
+    # pylint: disable-next=C0415
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        if not sheet_names:
+            sheet_names = [workbook.active.title]
+        widths = {}
+        for sheet in sheet_names:
+            if sheet not in workbook.sheetnames:
+                raise KeyError(sheet)
+            widths[sheet] = _sample_widths(workbook[sheet], sample_rows)
+        return widths
+    finally:
+        workbook.close()
+
+
+def _apply_widths(worksheet, widths: list[float]):
+    "sets the width of the first ``len(widths)`` columns"
+    # pylint: disable-next=C0415
+    from openpyxl.utils import get_column_letter
+
+    for index, width in enumerate(widths, start=1):
+        worksheet.column_dimensions[get_column_letter(index)].width = width
+
+
+def _header_styles(
+    header_color: str = 'D0EFFF',
+    bold: bool = True,
+    font_size: int = None,
+):
+    "returns the shared (fill, font, border) applied to header cells"
+    return styles.components(
+        styles.HeaderStyle(header_color, bold, font_size))
+
+
+def _style_header(
+    worksheet,
+    header_color: str = 'D0EFFF',
+    bold: bool = True,
+    font_size: int = None,
+    widths: list[float] | None = None,
+    preset: str | None = None,
+):
+    """styles the first row of an openpyxl worksheet and fits the column widths
+
+    Columns are sized by ``widths`` when given and by the header text
+    otherwise. With ``preset`` the cells reference that named style instead
+    of getting the other style arguments.
+    """
+    if preset:
+        style_name = styles.named_style(worksheet.parent, preset)
+    else:
+        fill, font, border = _header_styles(header_color, bold, font_size)
+
+    for cell in next(worksheet.iter_rows(min_row=1, max_row=1), ()):
+
+        col_width = 5
+
+        if preset:
+            cell.style = style_name
+        else:
+            cell.fill = fill
+            cell.font = font
+            cell.border = border
+
+        if len(str(cell.value)) > col_width:
+            col_width = len(str(cell.value))
+
+        adjusted_width = (col_width + 2) * 1.2
+
+        if widths is not None and cell.column <= len(widths):
+            adjusted_width = widths[cell.column - 1]
+
+        worksheet.column_dimensions[cell.column_letter].width = adjusted_width
+
+
 def style_excel(
     path: str,
     sheet_name: str | list[str] = None,
     header_color: str = 'D0EFFF',
     bold: bool = True,
     font_size: int = None,
+    header_only: bool = False,
+    auto_width: bool = False,
+    sample_rows: int = 1000,
+    preset: str | None = None,
 ):
     """
     Applies a header color, font size, and bold style to the first row of an Excel file.
@@ -359,87 +1202,372 @@ def style_excel(
         header_color (str, optional): The color to use for the header. Defaults to 'D0EFFF'.
         bold (bool, optional): Whether to apply bold style. Defaults to True.
         font_size (int, optional): The font size to use. Defaults to 12.
+        header_only (bool, optional): Patch the first row, the column widths
+            and the style table in the file directly instead of loading the
+            whole workbook, which is many times faster. The XML of each
+            styled sheet is still inflated and compressed again, so the
+            runtime grows with the size of those sheets. Falls back to
+            openpyxl for unsupported layouts. Defaults to False.
+        auto_width (bool, optional): Size the columns to the header and the
+            values of the first `sample_rows` rows instead of the header
+            only, see `column_widths`. Defaults to False.
+        sample_rows (int, optional): Rows read per sheet for auto_width.
+            Defaults to 1000.
+        preset (str, optional): Name of a header style registered with
+            `register_header_style`, used instead of header_color, bold and
+            font_size. Defaults to None.
     """
-    workbook = load_workbook(path)
-
     sheets = sheet_name
 
-    if not sheet_name:
-        sheets = [workbook.active.title]
+    header_style = styles.HeaderStyle(header_color, bold, font_size)
+    if preset:
+        header_style = styles.get_header_style(preset)
 
     if isinstance(sheet_name, str):
         sheets = [sheet_name]
 
-    # Define border style
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
-    for sheet in sheets:
-
-        if sheet not in workbook.sheetnames:
-            raise ValueError(f"Could not find sheet '{sheet}' in workbook")
-
-        input_worksheet = workbook[sheet]
-
-        for column in input_worksheet.iter_cols():
-
-            col_width = 5
+    if header_only:
+        # pylint: disable-next=C0415
+        from util import xlsx
 
-            column_letter = column[0].column_letter
+        try:
+            widths = None
+            if auto_width:
+                widths = _sample_sheet_widths(path, sheets, sample_rows)
 
-            column[0].fill = PatternFill(
-                fill_type='solid',
-                start_color=header_color,
-                end_color=header_color,
+            xlsx.style_header(
+                path,
+                sheets,
+                widths = widths,
+                **header_style._asdict(),
             )
+            return
+        except KeyError as e:
+            raise ValueError(
+                f"Could not find sheet '{e.args[0]}' in workbook") from e
+        except xlsx.XlsxPatchError:
+            pass
 
-            font_style = {}
+    # pylint: disable-next=C0415
+    from openpyxl import load_workbook
 
-            if bold:
-                font_style['bold'] = True
-
-            if font_size:
-                font_style['size'] = font_size
-
-            column[0].font = Font(**font_style)
+    workbook = load_workbook(path)
 
-            column[0].border = thin_border
+    if not sheet_name:
+        sheets = [workbook.active.title]
 
-            if len(str(column[0].value)) > col_width:
-                col_width = len(column[0].value)
+    for sheet in sheets:
 
-            adjusted_width = (col_width + 2) * 1.2
+        if sheet not in workbook.sheetnames:
+            raise ValueError(f"Could not find sheet '{sheet}' in workbook")
 
-            input_worksheet.column_dimensions[column_letter].width = adjusted_width
+        widths = None
+        if auto_width:
+            widths = _sample_widths(workbook[sheet], sample_rows)
+
+        _style_header(
+            workbook[sheet],
+            header_color = header_color,
+            bold = bold,
+            font_size = font_size,
+            widths = widths,
+            preset = preset,
+        )
 
     workbook.save(path)
 
+
 def fill_template(
     path: str,
     data: dict = None,
     output_format: TemplateOutputFormat | str = TemplateOutputFormat.HTML,
     verbose: bool = False,
+    cache: bool = True,
+    engine: TemplateEngine | str = TemplateEngine.FORMAT,
+    defaults: dict = None,
+    escape: bool = None,
 ):
-    if not data:
+    """
+    Fills the placeholders of a markdown template file.
+
+    With the 'format' engine placeholders use the `str.format` syntax, e.g.
+    `{name}`, and literal braces have to be doubled. The 'safe' engine only
+    replaces `{name}`, `{nested.key}` and `{name|default}` placeholders and
+    keeps every other brace, e.g. in CSS. It looks names up in nested dicts,
+    lists and DataFrame rows, see `util.template.SafeTemplate`.
+
+    Args:
+        path (str): The path to the template file.
+        data (dict, optional): Values of the placeholders. Defaults to None.
+        output_format (TemplateOutputFormat | str, optional): 'html' converts
+            the filled markdown to HTML, 'plain' returns it as is.
+            Defaults to 'html'.
+        verbose (bool, optional): Print the path. Defaults to False.
+        cache (bool, optional): Reuse the parsed template, and its HTML
+            conversion when the values allow it, until the file changes on
+            disk. See `clear_template_cache`. Defaults to True.
+        engine (TemplateEngine | str, optional): 'format' or 'safe'.
+            Defaults to 'format'.
+        defaults (dict, optional): 'safe' engine only. Values of missing or
+            empty placeholders, by name. Defaults to None.
+        escape (bool, optional): 'safe' engine only. HTML-escape the values.
+            Defaults to None, which escapes them for HTML output only.
+
+    Raises:
+        FileNotFoundError: If the template file does not exist.
+        KeyError: If a placeholder has no value in data.
+    """
+    if data is None:
         data = {}
 
     if isinstance(output_format, str):
         output_format = TemplateOutputFormat(output_format)
     assert isinstance(output_format, TemplateOutputFormat), "Invalid output format provided."
 
+    if isinstance(engine, str):
+        engine = TemplateEngine(engine)
+    assert isinstance(engine, TemplateEngine), "Invalid template engine provided."
+
     if verbose: print(path)
 
     if not os.path.exists(path):
         raise FileNotFoundError("No template file present.")
 
+    html = output_format == TemplateOutputFormat.HTML
+
+    if engine == TemplateEngine.SAFE:
+        if escape is None:
+            escape = html
+
+        if cache:
+            template = get_template(path, engine=engine.value)
+            render = template.render_html if html else template.render
+            return render(data, defaults=defaults, escape=escape)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            output_template = SafeTemplate(f.read()).render(
+                data, defaults=defaults, escape=escape)
+
+        if html:
+            # the cached HTML of render_html only pays off when reused
+            # pylint: disable-next=C0415
+            import markdown
+
+            output_template = markdown.markdown(output_template)
+
+        return output_template
+
+    if cache:
+        template = get_template(path)
+        if html:
+            return template.render_html(data)
+        return template.render(data)
+
     with open(path, 'r', encoding='utf-8') as f:
         template = f.read()
         output_template = template.format(**data)
         if output_format == TemplateOutputFormat.HTML:
+            # pylint: disable-next=C0415
+            import markdown
+
             output_template = markdown.markdown(output_template)
 
         return output_template
+
+
+def fill_template_bulk(
+    path: str,
+    data: "pd.DataFrame | Iterable[dict]",
+    output_format: TemplateOutputFormat | str = TemplateOutputFormat.HTML,
+    processes: int | None = None,
+    chunk_size: int = 500,
+    engine: TemplateEngine | str = TemplateEngine.FORMAT,
+    defaults: dict = None,
+    escape: bool = None,
+) -> "pd.Series | Iterable[str]":
+    """
+    Fills a template once for every row of data, e.g. for a mail merge.
+
+    The template is read, parsed and prepared for markdown once, instead of
+    once per row as with repeated `fill_template` calls.
+
+    Args:
+        path (str): The path to the template file.
+        data (pd.DataFrame | Iterable[dict]): Placeholder values, one row or
+            dict per output.
+        output_format (TemplateOutputFormat | str, optional): 'html' or
+            'plain'. Defaults to 'html'.
+        processes (int, optional): Render in a pool of that many processes,
+            for very large merges. Renders in this process when None or 1.
+            Defaults to None.
+        chunk_size (int, optional): Rows sent to a worker process at once.
+            Defaults to 500.
+        engine (TemplateEngine | str, optional): 'format' or 'safe', see
+            `fill_template`. Defaults to 'format'.
+        defaults (dict, optional): 'safe' engine only, see `fill_template`.
+        escape (bool, optional): 'safe' engine only, see `fill_template`.
+
+    Returns:
+        pd.Series | Iterable[str]: For a DataFrame, a Series of the outputs
+            with the same index. Otherwise a generator yielding the outputs
+            in input order.
+
+    Raises:
+        FileNotFoundError: If the template file does not exist.
+        KeyError: If a placeholder has no value in a row.
+    """
+    # pylint: disable-next=C0415
+    from util.template import render_many
+
+    if isinstance(output_format, str):
+        output_format = TemplateOutputFormat(output_format)
+    assert isinstance(output_format, TemplateOutputFormat), "Invalid output format provided."
+
+    if not os.path.exists(path):
+        raise FileNotFoundError("No template file present.")
+
+    if isinstance(engine, str):
+        engine = TemplateEngine(engine)
+    assert isinstance(engine, TemplateEngine), "Invalid template engine provided."
+
+    path = os.path.abspath(path)
+    html = output_format == TemplateOutputFormat.HTML
+
+    options = {}
+    if engine == TemplateEngine.SAFE:
+        options = {
+            "defaults": defaults,
+            "escape": html if escape is None else escape,
+        }
+
+    def _chunks(rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _render(rows):
+        if not processes or processes <= 1:
+            template = get_template(path, engine=engine.value)
+            render = template.render_html if html else template.render
+            for row in rows:
+                yield render(row, **options)
+            return
+
+        # pylint: disable-next=C0415
+        from collections import deque
+        # pylint: disable-next=C0415
+        from concurrent.futures import ProcessPoolExecutor
+
+        # only a few chunks are in flight, so generators are consumed lazily
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for chunk in _chunks(rows):
+                pending.append(executor.submit(
+                    render_many, path, chunk, html,
+                    engine=engine.value, **options,
+                ))
+                if len(pending) > 2 * processes:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    if _is_dataframe(data):
+        # pylint: disable-next=C0415
+        import pandas as pd
+
+        rows = data.to_dict("records")
+        return pd.Series(list(_render(rows)), index=data.index, dtype=object)
+
+    return _render(data)
+
+
+def _is_dataframe(value) -> bool:
+    "checks for a DataFrame without importing pandas"
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(value, pandas.DataFrame)
+
+
+def stream_template(
+    path: str,
+    data: dict = None,
+    output_format: TemplateOutputFormat | str = TemplateOutputFormat.HTML,
+    file=None,
+    engine: TemplateEngine | str = TemplateEngine.FORMAT,
+    defaults: dict = None,
+    escape: bool = None,
+    block_size: int = 65536,
+) -> "Iterable[str] | int":
+    """
+    Fills a large template piece by piece, with bounded memory usage.
+
+    The template is read, filled and converted in blocks of about
+    `block_size` characters that end at paragraph boundaries. Long tables
+    and lists are split between rows or items and their HTML is merged
+    again. A block is only held in memory as a whole, so a single
+    paragraph, code block, blockquote or raw HTML block larger than
+    `block_size` is read and converted in one piece. The output is the
+    same as `fill_template` gives, except that reference-style links only
+    resolve within their own block.
+
+    Args:
+        path (str): The path to the template file.
+        data (dict, optional): Values of the placeholders. Defaults to None.
+        output_format (TemplateOutputFormat | str, optional): 'html' or
+            'plain'. Defaults to 'html'.
+        file (optional): Text file-like object the output is written to,
+            e.g. an open file or `socket.makefile("w")`. When None, the
+            output parts are returned as a generator. Defaults to None.
+        engine (TemplateEngine | str, optional): 'format' or 'safe', see
+            `fill_template`. Defaults to 'format'.
+        defaults (dict, optional): 'safe' engine only, see `fill_template`.
+        escape (bool, optional): 'safe' engine only, see `fill_template`.
+        block_size (int, optional): Minimum characters of template per
+            block. Defaults to 65536.
+
+    Returns:
+        Iterable[str] | int: the generator of output parts, or the number
+            of characters written to file
+
+    Raises:
+        FileNotFoundError: If the template file does not exist.
+        KeyError: If a placeholder has no value in data.
+    """
+    # pylint: disable-next=C0415
+    from util.template import stream
+
+    if isinstance(output_format, str):
+        output_format = TemplateOutputFormat(output_format)
+    assert isinstance(output_format, TemplateOutputFormat), "Invalid output format provided."
+
+    if isinstance(engine, str):
+        engine = TemplateEngine(engine)
+    assert isinstance(engine, TemplateEngine), "Invalid template engine provided."
+
+    if not os.path.exists(path):
+        raise FileNotFoundError("No template file present.")
+
+    html = output_format == TemplateOutputFormat.HTML
+
+    options = {}
+    if engine == TemplateEngine.SAFE:
+        options = {
+            "defaults": defaults,
+            "escape": html if escape is None else escape,
+        }
+
+    parts = stream(
+        path, data, html, engine.value, block_size=block_size, **options)
+
+    if file is None:
+        return parts
+
+    written = 0
+    for part in parts:
+        file.write(part)
+        written += len(part)
+    return written
@@ -0,0 +1,329 @@
+"""asyncio counterparts of the mailing functions in `util`.
+
+SMTP traffic goes through aiosmtplib, while building the message (which reads
+the attachments), file based rate limiting and Outlook's COM calls run in
+worker threads, so the event loop is never blocked. Logged in SMTP clients
+are kept per event loop and reused, like the sessions of `util.smtp_pool`.
+The module level smtp settings of `util` are used.
+"""
+
+import time
+import asyncio
+import warnings
+from typing import Iterable
+import util
+from util import EmailMode, MailResult
+
+# aiosmtplib install check
+try:
+    import aiosmtplib
+except ImportError as e:
+    raise ImportError("aiosmtplib library not found.\n"
+    "Please install it using pip: `pip install aiosmtplib`") from e
+
+
+max_concurrency: int = 10
+# seconds after which an unused SMTP client is closed instead of reused
+idle_timeout: float = 60.0
+
+_semaphores: dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+_client_pools: dict[asyncio.AbstractEventLoop, "_ClientPool"] = {}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    "returns the semaphore limiting concurrent sends on the running loop"
+    loop = asyncio.get_running_loop()
+
+    for known_loop in [known for known in _semaphores if known.is_closed()]:
+        del _semaphores[known_loop]
+
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(max_concurrency)
+    return _semaphores[loop]
+
+
+async def _quit(client: aiosmtplib.SMTP):
+    "closes a client, ignoring errors from an already dead connection"
+    try:
+        await client.quit()
+    # pylint: disable-next=W0718
+    except Exception:
+        client.close()
+
+
+class _ClientPool:
+    """Logged in aiosmtplib clients of one event loop.
+
+    Clients are keyed by ``(host, port, username)``. At most
+    `max_concurrency` idle clients are kept per key, since the semaphore of
+    the loop never lets more sends run at once.
+    """
+
+    def __init__(self):
+        self._idle: dict[tuple, list[tuple[float, aiosmtplib.SMTP]]] = {}
+
+    async def _checkout(self, key: tuple) -> aiosmtplib.SMTP | None:
+        "returns a connected idle client for ``key``, None if there is none"
+        idle = self._idle.get(key, [])
+        while idle:
+            stamp, client = idle.pop()
+            if time.monotonic() - stamp < idle_timeout and client.is_connected:
+                return client
+            await _quit(client)
+        return None
+
+    async def _checkin(self, key: tuple, client: aiosmtplib.SMTP):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < max_concurrency:
+            idle.append((time.monotonic(), client))
+        else:
+            await _quit(client)
+
+    async def discard(self, key: tuple):
+        "closes every idle client of ``key``"
+        for _, client in self._idle.pop(key, []):
+            await _quit(client)
+
+    async def close(self):
+        "closes every idle client"
+        for key in list(self._idle):
+            await self.discard(key)
+
+    async def send(self, key: tuple, password: str | None, msg, recipients):
+        """Sends ``msg`` over an idle client, or a new one.
+
+        A client that fails is closed. When the server dropped a reused
+        client, the other idle clients are closed as well and the send is
+        retried once over a new client.
+        """
+        host, port, username = key
+        client = await self._checkout(key)
+        reused = client is not None
+
+        for _ in range(2):
+            if client is None:
+                client = aiosmtplib.SMTP(
+                    hostname = host,
+                    port = port,
+                    username = username,
+                    password = password,
+                    use_tls = port != 587,
+                    start_tls = port == 587,
+                )
+                await client.connect()
+
+            try:
+                await client.send_message(
+                    msg, sender = msg['From'], recipients = recipients)
+            except aiosmtplib.SMTPServerDisconnected:
+                client.close()
+                if not reused:
+                    raise
+                await self.discard(key)
+                client, reused = None, False
+                continue
+            except BaseException:
+                await _quit(client)
+                raise
+
+            await self._checkin(key, client)
+            return
+
+
+def _get_client_pool() -> _ClientPool:
+    "returns the SMTP clients of the running loop"
+    loop = asyncio.get_running_loop()
+
+    for known_loop in [known for known in _client_pools if known.is_closed()]:
+        del _client_pools[known_loop]
+
+    if loop not in _client_pools:
+        _client_pools[loop] = _ClientPool()
+    return _client_pools[loop]
+
+
+async def close_connections():
+    "closes the idle SMTP clients of the running loop, e.g. before it stops"
+    pool = _client_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+async def _bucket_call(bucket, method: str, *args):
+    "calls a bucket method, in a worker thread when it does file I/O"
+    if bucket.state_path:
+        return await asyncio.to_thread(getattr(bucket, method), *args)
+    return getattr(bucket, method)(*args)
+
+
+def _is_throttled(error: Exception) -> bool:
+    "whether the server asked the client to slow down"
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return any(
+            refused.code in util._THROTTLE_CODES  # pylint: disable=W0212
+            for refused in error.recipients
+        )
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code in util._THROTTLE_CODES  # pylint: disable=W0212
+    return False
+
+
+# pylint: disable=W0212
+async def _api_mailing_async(
+        subject: str,
+        message: str,
+        recipients: list[str],
+        mail_type: str = "plain",
+        attachments: list[str] = None,
+        cc: list[str] = None,
+        bcc: list[str] = None,
+):
+    username, password = util._smtp_credentials()
+
+    msg, recipients = await asyncio.to_thread(
+        util._build_message,
+        subject = subject,
+        message = message,
+        recipients = recipients,
+        mail_type = mail_type,
+        attachments = attachments,
+        cc = cc,
+        bcc = bcc,
+    )
+
+    bucket = util._smtp_bucket()
+    while wait := await _bucket_call(bucket, "try_acquire"):
+        await asyncio.sleep(wait)
+
+    key = (util.smtp_host, int(util.smtp_port), username)
+
+    try:
+        await _get_client_pool().send(key, password, msg, recipients)
+    except aiosmtplib.SMTPException as e:
+        if _is_throttled(e):
+            await _bucket_call(bucket, "backoff")
+        raise
+
+    await _bucket_call(bucket, "recover")
+
+
+async def _send_with_fallback_async(modes: list[EmailMode], **kwargs):
+    """tries every mode in order and raises the last error if none succeeded
+
+    Like `util._send_with_fallback`, invalid arguments are raised right away
+    without counting against a mode.
+    """
+    util._check_mail(
+        kwargs.get("mail_type", "plain"), kwargs.get("attachments"))
+    error = ValueError("No email mode provided.")
+
+    for mode_ in util._modes_to_try(modes):
+        breaker = util._mode_breaker(mode_)
+        try:
+            await send_mail_async(mode=mode_, **kwargs)
+
+        except util._INPUT_ERRORS:
+            raise
+
+        # pylint: disable-next=W0718
+        except Exception as e:
+            breaker.record_failure()
+            error = e
+            warnings.warn(f"Failed to send mail via '{mode_}' mode.")
+            continue
+
+        breaker.record_success()
+        return
+
+    raise error
+
+
+async def send_mail_async(
+        subject: str,
+        message: str,
+        recipients: list[str],
+        mail_type: str = "plain",
+        attachments: list[str] = None,
+        mode: EmailMode | list[EmailMode] = None,
+        cc: list[str] = None,
+        bcc: list[str] = None,
+):
+    """sends mail without blocking the event loop
+
+    Behaves like `util.send_mail`, including the fallback through a list of
+    modes. At most `max_concurrency` sends run at once on an event loop.
+
+    Args:
+        subject (str): subject to send
+        message (str): message to send
+        recipients (list[str]): email addresses to send to
+        mail_type (str, optional): 'plain' or 'html'. Defaults to "plain".
+        attachments (list[str], optional): paths of files to attach
+        mode (EmailMode | list[EmailMode], optional): mode or fallback
+            chain. Defaults to [EmailMode.OUTLOOK, EmailMode.API].
+        cc (list[str], optional): addresses to send a copy to
+        bcc (list[str], optional): addresses to send a blind copy to
+    """
+    if not mode:
+        mode = [EmailMode.OUTLOOK, EmailMode.API]
+
+    kwargs = {
+        "subject": subject,
+        "message": message,
+        "recipients": recipients,
+        "mail_type": mail_type,
+        "attachments": attachments,
+        "cc": cc,
+        "bcc": bcc,
+    }
+
+    if mode == EmailMode.OUTLOOK:
+        async with _get_semaphore():
+            await asyncio.to_thread(util._outlook_mailing, **kwargs)
+
+    elif mode == EmailMode.API:
+        async with _get_semaphore():
+            await _api_mailing_async(**kwargs)
+
+    elif mode == EmailMode.QUEUED:
+        await asyncio.to_thread(util.send_mail, mode=mode, **kwargs)
+
+    elif isinstance(mode, list):
+        try:
+            await _send_with_fallback_async(modes=mode, **kwargs)
+        # pylint: disable-next=W0718
+        except Exception:
+            pass
+
+    else:
+        raise ValueError(
+            "Invalid email mode. Choose 'outlook', 'api' or 'queued'.")
+
+
+async def send_mail_batch_async(
+        messages: Iterable[dict],
+        mode: EmailMode | list[EmailMode] = EmailMode.API,
+) -> list[MailResult]:
+    """sends many mails concurrently on the running event loop
+
+    The async counterpart of `util.send_mail_batch`. Concurrency is bounded
+    by `max_concurrency`.
+
+    Returns:
+        list[MailResult]: one result per message, in input order
+    """
+    async def _send(index: int, spec: dict) -> MailResult:
+        try:
+            if isinstance(mode, list):
+                await _send_with_fallback_async(modes=mode, **spec)
+            else:
+                await send_mail_async(mode=mode, **spec)
+        # pylint: disable-next=W0718
+        except Exception as e:
+            return MailResult(index, False, e)
+        return MailResult(index, True)
+
+    return await asyncio.gather(*(
+        _send(index, spec)
+        for index, spec in enumerate(messages)
+    ))
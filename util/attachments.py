@@ -0,0 +1,193 @@
+"""Streaming, cached base64 encoding of mail attachments.
+
+Attachments are read in fixed size chunks and encoded on the fly into one
+buffer of the final size, so the raw file is never held in memory. The
+encoded payload is cached by content hash and looked up by
+``(path, mtime, size)``, so sending the same report to many recipients
+encodes it once until the file changes on disk.
+
+Memory: an encoded payload is 4/3 of the file size. Turning the buffer into
+the payload string briefly needs both. `iter_bytes` writes a message out
+without copying the payloads again, so sending a mail over a pooled SMTP
+session needs no further copy of the message. The cache keeps up to
+`max_cache_bytes` of payloads for the life of the process. Set it to 0 to
+disable caching, or call `clear_cache`.
+"""
+
+import os
+import base64
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from email.message import Message
+from email.generator import BytesGenerator
+from email.mime.base import MIMEBase
+
+
+# multiple of 57 bytes, so every chunk encodes to whole 76 character lines
+CHUNK_SIZE = 57 * 1024
+
+max_cache_bytes: int = 64 * 1024 * 1024
+
+_by_stat: dict[str, tuple[int, int, str]] = {}
+_by_digest: OrderedDict[str, str] = OrderedDict()
+_cached_bytes = 0
+_lock = threading.Lock()
+
+
+def _encoded_size(size: int) -> int:
+    "length of ``base64.encodebytes`` of ``size`` bytes, newlines included"
+    return 4 * -(-size // 3) + -(-size // 57)
+
+
+def _encode(path: str, size: int) -> tuple[str, str]:
+    "streams ``path`` through base64, returning (sha256 digest, payload)"
+    digest = hashlib.sha256()
+    payload = bytearray(_encoded_size(size))
+    position = 0
+
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+            encoded = base64.encodebytes(chunk)
+            # grows the buffer if the file grew since it was sized
+            payload[position:position + len(encoded)] = encoded
+            position += len(encoded)
+
+    del payload[position:]
+    return digest.hexdigest(), payload.decode("ascii")
+
+
+def _store(path: str, key: tuple[int, int], digest: str, payload: str) -> str:
+    "caches ``payload`` and returns the instance shared by equal contents"
+    global _cached_bytes  # pylint: disable=W0603
+
+    with _lock:
+        if digest in _by_digest:
+            _by_digest.move_to_end(digest)
+            payload = _by_digest[digest]
+        elif len(payload) <= max_cache_bytes:
+            _by_digest[digest] = payload
+            _cached_bytes += len(payload)
+
+            while _cached_bytes > max_cache_bytes:
+                _, evicted = _by_digest.popitem(last=False)
+                _cached_bytes -= len(evicted)
+        else:
+            return payload
+
+        _by_stat[path] = (*key, digest)
+        return payload
+
+
+def encode_file(path: str | os.PathLike) -> str:
+    """Returns the base64 payload of a file, encoding it only when needed.
+
+    Args:
+        path (str | os.PathLike): path of the file to encode
+
+    Returns:
+        str: base64 encoded content split in 76 character lines
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    with _lock:
+        cached = _by_stat.get(path)
+        if cached and cached[:2] == key and cached[2] in _by_digest:
+            _by_digest.move_to_end(cached[2])
+            return _by_digest[cached[2]]
+
+    digest, payload = _encode(path, stat.st_size)
+    return _store(path, key, digest, payload)
+
+
+def attachment_part(path: str | os.PathLike) -> MIMEBase:
+    """Builds a MIME attachment for a file from its cached payload.
+
+    The result is equivalent to a ``MIMEApplication`` of the file content
+    with a ``Content-Disposition: attachment`` header.
+    """
+    filename = os.path.basename(path)
+
+    part = MIMEBase("application", "octet-stream", Name=filename)
+    part.set_payload(encode_file(path))
+    part['Content-Transfer-Encoding'] = 'base64'
+    part['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    return part
+
+
+def _flatten(part: Message) -> bytes:
+    "``part.as_bytes()`` of a message without a unix from line"
+    buffer = BytesIO()
+    BytesGenerator(buffer, mangle_from_=False, policy=part.policy).flatten(part)
+    return buffer.getvalue()
+
+
+def _headers(part: Message) -> bytes:
+    "the header block of ``part``, as the generator writes it"
+    return b"".join(
+        part.policy.fold_binary(name, value)
+        for name, value in part.raw_items()
+    ) + b"\n"
+
+
+def iter_bytes(msg: Message, chunk_size: int = CHUNK_SIZE):
+    """Yields the bytes of ``msg.as_bytes()`` piece by piece.
+
+    The base64 payloads of the parts of a multipart message are written in
+    slices of ``chunk_size`` characters instead of being copied into one
+    string of the whole message. Lines end with ``\\n``.
+
+    Yields:
+        bytes: consecutive pieces of the message
+    """
+    if not msg.is_multipart() or msg.preamble or msg.epilogue:
+        yield msg.as_bytes()
+        return
+
+    subparts = msg.get_payload()
+    streamed = [
+        not part.is_multipart()
+        and part.get("Content-Transfer-Encoding") == "base64"
+        and isinstance(part.get_payload(), str)
+        for part in subparts
+    ]
+    texts = [
+        None if stream else _flatten(part)
+        for part, stream in zip(subparts, streamed)
+    ]
+
+    # the boundary has to be in the headers before the parts are written,
+    # base64 payloads can never contain its run of '='
+    if msg.get_boundary() is None:
+        # pylint: disable-next=W0212
+        msg.set_boundary(BytesGenerator._make_boundary(
+            b"".join(text for text in texts if text)))
+    boundary = msg.get_boundary().encode("ascii")
+
+    yield _headers(msg)
+    for index, (part, text) in enumerate(zip(subparts, texts)):
+        yield (b"\n" if index else b"") + b"--" + boundary + b"\n"
+        if text is not None:
+            yield text
+            continue
+
+        yield _headers(part)
+        payload = part.get_payload()
+        for start in range(0, len(payload), chunk_size):
+            yield payload[start:start + chunk_size].encode("ascii")
+    yield b"\n--" + boundary + b"--\n"
+
+
+def clear_cache():
+    "drops every cached payload"
+    global _cached_bytes  # pylint: disable=W0603
+
+    with _lock:
+        _by_stat.clear()
+        _by_digest.clear()
+        _cached_bytes = 0
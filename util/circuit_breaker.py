@@ -0,0 +1,127 @@
+"""Circuit breaker tracking the health of a failing dependency.
+
+After ``failure_threshold`` consecutive failures the breaker opens and
+callers skip the dependency for ``cooldown`` seconds. Then a single probe is
+let through: a success closes the breaker again, a failure re-opens it for
+another cooldown.
+"""
+
+import time
+import threading
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive failure circuit breaker.
+
+    Args:
+        failure_threshold (int, optional): consecutive failures that open
+            the breaker. Defaults to 3.
+        cooldown (float, optional): seconds the breaker stays open before
+            a probe is allowed. Defaults to 300.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._failures = 0
+        self._successes = 0
+        self._skipped = 0
+        self._opened_at: float | None = None
+        self._probe_started: float | None = None
+        self._last_failure: float | None = None
+
+    def allow(self) -> bool:
+        """Whether the protected call should be attempted now.
+
+        When the cooldown has passed, the first caller gets to probe and
+        everyone else is still turned away until the probe reports back.
+        """
+        with self._lock:
+            now = time.monotonic()
+
+            if self._state == CLOSED:
+                return True
+
+            if self._state == OPEN and now - self._opened_at >= self.cooldown:
+                self._state = HALF_OPEN
+                self._probe_started = now
+                return True
+
+            # a probe that never reported back does not block forever
+            if (
+                self._state == HALF_OPEN
+                and now - self._probe_started >= self.cooldown
+            ):
+                self._probe_started = now
+                return True
+
+            self._skipped += 1
+            return False
+
+    def record_success(self):
+        "reports a successful call and closes the breaker"
+        with self._lock:
+            self._successes += 1
+            self._consecutive_failures = 0
+            self._state = CLOSED
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self):
+        "reports a failed call, opening the breaker when needed"
+        with self._lock:
+            now = time.monotonic()
+            self._failures += 1
+            self._consecutive_failures += 1
+            self._last_failure = time.time()
+
+            if (
+                self._state == HALF_OPEN
+                or self._consecutive_failures >= self.failure_threshold
+            ):
+                self._state = OPEN
+                self._opened_at = now
+                self._probe_started = None
+
+    def reset(self):
+        "forgets every recorded failure and closes the breaker"
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    @property
+    def state(self) -> str:
+        "one of 'closed', 'open' or 'half_open'"
+        with self._lock:
+            return self._state
+
+    def stats(self) -> dict:
+        "returns a snapshot of the breaker state and counters"
+        with self._lock:
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = max(
+                    0.0,
+                    self.cooldown - (time.monotonic() - self._opened_at),
+                )
+
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "failures": self._failures,
+                "successes": self._successes,
+                "skipped": self._skipped,
+                "last_failure": self._last_failure,
+                "retry_in": retry_in,
+            }
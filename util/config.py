@@ -0,0 +1,374 @@
+"""Memoized and layered loading of JSON and YAML configuration files.
+
+Parsed configs are cached by resolved path and reused until the file's
+mtime, size or inode changes. Callers get either an independent copy of the
+cached object or a read-only view of it, so the cache can never be modified
+through a returned value.
+
+`get_layered_config` merges the global and project copies of several files
+with environment variable overrides, and can store the result in a snapshot
+file that later cold starts load with a single read.
+"""
+
+import os
+import json
+import pickle
+import threading
+from types import MappingProxyType
+
+
+GLOBAL_CONFIG_DIR = "Project Configurations"
+SNAPSHOT_VERSION = 1
+
+
+_cache: dict[tuple, tuple] = {}
+_lock = threading.Lock()
+
+
+def config_path(file_name: str, is_global: bool = False) -> str:
+    "returns where `util.get_config` looks for ``file_name``"
+    if is_global:
+        base_path = os.path.join(
+            os.path.expanduser('~'), GLOBAL_CONFIG_DIR)
+    else:
+        base_path = os.getcwd()
+
+    return os.path.join(
+        base_path,
+        file_name,
+    )
+
+
+def _yaml_loader():
+    "returns libyaml's FullLoader when available, the pure Python one otherwise"
+    # pylint: disable-next=C0415
+    import yaml
+
+    return getattr(yaml, "CFullLoader", yaml.FullLoader)
+
+
+def parse_config(path: str, file_type: str = "json", encoding: str = "utf-8"):
+    """Reads and parses a config file without any caching.
+
+    Raises:
+        ValueError: If the file_type is neither 'json' nor 'yaml'.
+    """
+    with open(path, 'r', encoding=encoding) as f:
+        if file_type == "json":
+            return json.load(f)
+        if file_type == "yaml":
+            # pylint: disable-next=C0415
+            import yaml
+
+            return yaml.load(f.read(), Loader=_yaml_loader())
+
+    raise ValueError(f"File type {file_type} not supported")
+
+
+def _copy(value):
+    "copies the containers of a parsed config, sharing the immutable leaves"
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+def freeze(value):
+    "returns a read-only view of a parsed config"
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def load_config(
+    path: str,
+    file_type: str = "json",
+    encoding: str = "utf-8",
+    readonly: bool = False,
+):
+    """Loads a config file, parsing it only when it changed on disk.
+
+    Args:
+        path (str): path of the config file.
+        file_type (str, optional): 'json' or 'yaml'. Defaults to 'json'.
+        encoding (str, optional): encoding of the file. Defaults to 'utf-8'.
+        readonly (bool, optional): return a shared read-only view
+            (``MappingProxyType``/``tuple``) instead of a private copy.
+            Defaults to False.
+
+    Returns:
+        The parsed config.
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    key = (path, file_type, encoding)
+
+    with _lock:
+        cached = _cache.get(key)
+
+    if cached is None or cached[0] != signature:
+        config = parse_config(path, file_type, encoding)
+        cached = (signature, config, freeze(config))
+        with _lock:
+            _cache[key] = cached
+
+    if readonly:
+        return cached[2]
+    return _copy(cached[1])
+
+
+def invalidate_config(path: str | None = None):
+    """Drops cached configs.
+
+    Args:
+        path (str, optional): only drop this file. Drops every cached config
+            when None. Defaults to None.
+    """
+    with _lock:
+        if path is None:
+            _cache.clear()
+            return
+
+        path = os.path.realpath(path)
+        for key in [key for key in _cache if key[0] == path]:
+            del _cache[key]
+
+
+def _file_type(file_name: str) -> str:
+    "infers 'json' or 'yaml' from the file extension"
+    if file_name.lower().endswith((".yaml", ".yml")):
+        return "yaml"
+    return "json"
+
+
+def _signature(path: str):
+    "returns what identifies the current version of ``path``, None if missing"
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def merge(base, overlay):
+    """Deep merges ``overlay`` into ``base``.
+
+    Dictionaries are merged key by key, any other value of ``overlay``
+    replaces the one of ``base``. ``base`` is updated in place and returned.
+    """
+    if isinstance(base, dict) and isinstance(overlay, dict):
+        for key, value in overlay.items():
+            base[key] = merge(base[key], value) if key in base else value
+        return base
+    return overlay
+
+
+def _existing_key(node, key: str) -> str:
+    "returns the key of ``node`` equal to ``key`` ignoring case, else ``key``"
+    if isinstance(node, dict) and key not in node:
+        for existing in node:
+            if isinstance(existing, str) and existing.lower() == key:
+                return existing
+    return key
+
+
+def env_overlay(prefix: str, separator: str = "__", base=None) -> dict:
+    """Builds a config from environment variables.
+
+    ``<PREFIX><separator>DATABASE<separator>HOST=db`` becomes
+    ``{"database": {"host": "db"}}``. Values are parsed as JSON when
+    possible, so numbers, booleans and lists keep their type.
+
+    Variable names are case-insensitive: keys are lowercased, unless
+    ``base`` already has the key in another case, e.g. ``APP__APIKEY``
+    overrides ``apiKey``.
+    """
+    overlay = {}
+    start = prefix + separator
+
+    for name in sorted(os.environ):
+        if not name.startswith(start):
+            continue
+
+        keys = []
+        existing = base
+        for key in name[len(start):].split(separator):
+            key = _existing_key(existing, key.lower())
+            keys.append(key)
+            existing = existing.get(key) if isinstance(existing, dict) else None
+
+        try:
+            value = json.loads(os.environ[name])
+        except ValueError:
+            value = os.environ[name]
+
+        node = overlay
+        for key in keys[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        node[keys[-1]] = value
+
+    return overlay
+
+
+def _env_items(prefix: str | None, separator: str) -> list[tuple[str, str]]:
+    if not prefix:
+        return []
+    start = prefix + separator
+    return sorted(
+        (name, value) for name, value in os.environ.items()
+        if name.startswith(start)
+    )
+
+
+def _is_trusted(f) -> bool:
+    "whether only the current user can have written the open file ``f``"
+    if not hasattr(os, "getuid"):
+        return True
+    stat = os.fstat(f.fileno())
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def _load_snapshot(path: str, sources: list[str], env: list):
+    """returns the snapshot config if it is still valid, None otherwise
+
+    Unpickling runs code, so snapshots other users could have written are
+    ignored.
+    """
+    try:
+        with open(path, "rb") as f:
+            if not _is_trusted(f):
+                return None
+            snapshot = pickle.load(f)
+    # pylint: disable-next=W0718
+    except Exception:
+        return None
+
+    if (
+        not isinstance(snapshot, dict)
+        or snapshot.get("version") != SNAPSHOT_VERSION
+        or snapshot.get("env") != env
+        or [source for source, _ in snapshot.get("sources", [])] != sources
+    ):
+        return None
+
+    for source, signature in snapshot["sources"]:
+        if _signature(source) != signature:
+            return None
+
+    return snapshot["config"]
+
+
+def _write_snapshot(path: str, snapshot: dict):
+    """writes the snapshot atomically, so readers never see a partial file
+
+    The snapshot can hold secrets, so only the current user may read it.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        fd = os.open(
+            temp_path,
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+            0o600,
+        )
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError:
+        # a missing snapshot only costs the next start a rebuild
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def get_layered_config(
+    file_names: str | list[str],
+    env_prefix: str | None = None,
+    env_separator: str = "__",
+    snapshot_path: str | None = None,
+    encoding: str = "utf-8",
+    readonly: bool = False,
+) -> dict:
+    """Loads a configuration merged from several layers.
+
+    Layers are merged in this order, later ones overriding earlier ones:
+
+    1. every file of ``file_names`` found in the global
+       "Project Configurations" directory, in the given order
+    2. every file of ``file_names`` found in the current working directory
+    3. environment variables starting with ``env_prefix`` (see
+       `env_overlay`)
+
+    Files are parsed as YAML when they end in .yaml/.yml and as JSON
+    otherwise. Missing files are skipped.
+
+    Args:
+        file_names (str | list[str]): names of the config files.
+        env_prefix (str, optional): prefix of the environment variables
+            overriding file values. Defaults to None, which skips the
+            environment layer.
+        env_separator (str, optional): separator of nested keys in variable
+            names. Defaults to "__".
+        snapshot_path (str, optional): file caching the merged result. It is
+            rebuilt whenever a source file or a prefixed environment
+            variable changes. It is only readable by the current user, and
+            ignored when another user could have written it.
+            Defaults to None.
+        encoding (str, optional): encoding of the files. Defaults to 'utf-8'.
+        readonly (bool, optional): return a read-only view instead of a
+            plain dict. Defaults to False.
+
+    Returns:
+        dict: the merged configuration
+
+    Raises:
+        FileNotFoundError: If none of the files exists in either directory.
+    """
+    if isinstance(file_names, str):
+        file_names = [file_names]
+
+    sources = [
+        config_path(file_name, is_global)
+        for is_global in (True, False)
+        for file_name in file_names
+    ]
+    env = _env_items(env_prefix, env_separator)
+
+    if snapshot_path:
+        config = _load_snapshot(snapshot_path, sources, env)
+        if config is not None:
+            return freeze(config) if readonly else config
+
+    signatures = [(source, _signature(source)) for source in sources]
+    if all(signature is None for _, signature in signatures):
+        raise FileNotFoundError(
+            f"None of {file_names} found at {os.path.dirname(sources[0])} "
+            f"or {os.path.dirname(sources[-1])}")
+
+    config = {}
+    for source, signature in signatures:
+        if signature is not None:
+            config = merge(config, load_config(
+                source, _file_type(source), encoding))
+
+    if env_prefix:
+        config = merge(
+            config, env_overlay(env_prefix, env_separator, config))
+
+    if snapshot_path:
+        _write_snapshot(snapshot_path, {
+            "version": SNAPSHOT_VERSION,
+            "sources": signatures,
+            "env": env,
+            "config": config,
+        })
+
+    return freeze(config) if readonly else config
@@ -0,0 +1,143 @@
+"""File system helpers shared by the other utility modules."""
+
+import os
+import time
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Inter-process exclusive lock backed by a lock file.
+
+    Uses ``fcntl.flock`` on POSIX and ``msvcrt.locking`` on Windows. The lock
+    file is created when needed and left in place after release.
+
+    Args:
+        path (str | os.PathLike): path of the lock file.
+        timeout (float, optional): seconds to wait for the lock before
+            raising TimeoutError. Waits forever when None. Defaults to None.
+        poll_interval (float, optional): seconds between two attempts.
+            Defaults to 0.05.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        timeout: float | None = None,
+        poll_interval: float = 0.05,
+    ):
+        self.path = os.fspath(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self):
+        "blocks until the lock is held"
+        if self._fd is not None:
+            raise RuntimeError(f"Lock {self.path} is already held")
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+
+        while not self._try_lock(fd):
+            if deadline is not None and time.monotonic() >= deadline:
+                os.close(fd)
+                raise TimeoutError(f"Could not acquire lock {self.path}")
+            time.sleep(self.poll_interval)
+
+        self._fd = fd
+
+    def release(self):
+        "releases the lock"
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def ensure_writable(path: str | os.PathLike):
+    """Fails fast when an existing file cannot be written.
+
+    On Windows a workbook opened in Excel cannot be opened for writing, so
+    this raises PermissionError before any work is done.
+    """
+    if os.path.exists(path):
+        with open(path, "r+b"):
+            pass
+
+
+@contextmanager
+def atomic_path(path: str | os.PathLike, copy_existing: bool = False):
+    """Yields a temporary path which replaces ``path`` when the block succeeds.
+
+    The temporary file lives in the same directory and keeps the extension
+    of ``path``. After the block it is flushed to disk and atomically renamed
+    over ``path``, so readers see either the old or the new file and never a
+    partially written one. If the block raises, ``path`` is left untouched.
+    An existing file keeps its permission bits.
+
+    Args:
+        path (str | os.PathLike): file to write.
+        copy_existing (bool, optional): start from a copy of the current
+            file, for in-place updates. Defaults to False.
+    """
+    path = os.fspath(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    extension = os.path.splitext(path)[1]
+
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=".~", suffix=extension)
+    os.close(fd)
+
+    try:
+        if copy_existing and os.path.exists(path):
+            shutil.copyfile(path, temp_path)
+        else:
+            os.remove(temp_path)
+
+        yield temp_path
+
+        with open(temp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        # mkstemp creates the file with mode 0600
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,272 @@
+"""Durable outbound mail queue.
+
+Mails are persisted in a SQLite database and sent by a background worker
+thread, so producers never wait on SMTP latency and nothing is lost while
+the SMTP host is unavailable. Failed sends are retried with exponential
+backoff and moved to a dead letter state after ``max_attempts``.
+
+Attachments are stored as paths and read when the mail is actually sent, so
+they must still exist at that point.
+
+The worker is a daemon thread, so a process can exit with mails still in the
+queue. They stay in the database until a worker or `MailQueue.drain` of any
+later process sends them.
+"""
+
+import json
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+
+PENDING = "pending"
+SENDING = "sending"
+DEAD = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    claimed_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mails_due ON mails (status, next_attempt);
+"""
+
+
+class MailQueue:
+    """SQLite backed queue of mails waiting to be sent.
+
+    Several threads and processes may share one database file. A mail
+    claimed by a worker that died is handed out again after
+    ``claim_timeout`` seconds.
+
+    Args:
+        path (str): path of the SQLite database file.
+        sender (callable): called with the keyword arguments of a queued
+            mail. It must raise when the mail could not be sent.
+        max_attempts (int, optional): attempts before a mail is dead
+            lettered. Defaults to 5.
+        base_delay (float, optional): seconds before the first retry, doubled
+            on every further attempt. Defaults to 30.
+        max_delay (float, optional): upper bound of the retry delay.
+            Defaults to 3600.
+        claim_timeout (float, optional): seconds after which a claimed but
+            unfinished mail is considered abandoned. Defaults to 600.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sender,
+        max_attempts: int = 5,
+        base_delay: float = 30.0,
+        max_delay: float = 3600.0,
+        claim_timeout: float = 600.0,
+    ):
+        self.path = path
+        self.sender = sender
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.claim_timeout = claim_timeout
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._worker: threading.Thread | None = None
+
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def put(self, **mail) -> int:
+        """Persists a mail and wakes the worker.
+
+        Args:
+            **mail: keyword arguments for the sender, e.g. subject, message,
+                recipients, mail_type, attachments, cc and bcc.
+
+        Returns:
+            int: id of the queued mail
+        """
+        now = time.time()
+
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "INSERT INTO mails (payload, next_attempt, created_at) "
+                "VALUES (?, ?, ?)",
+                (json.dumps(mail), now, now),
+            )
+            mail_id = cursor.lastrowid
+
+        self._wakeup.set()
+        return mail_id
+
+    def _claim(self, connection: sqlite3.Connection):
+        "marks the oldest due mail as being sent and returns it"
+        now = time.time()
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT id, payload, attempts FROM mails "
+                "WHERE (status = ? AND next_attempt <= ?) "
+                "OR (status = ? AND claimed_at <= ?) "
+                "ORDER BY id LIMIT 1",
+                (PENDING, now, SENDING, now - self.claim_timeout),
+            ).fetchone()
+
+            if row is not None:
+                connection.execute(
+                    "UPDATE mails SET status = ?, claimed_at = ? WHERE id = ?",
+                    (SENDING, now, row[0]),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        return row
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    def process_one(self) -> bool:
+        """Sends the oldest due mail, if any.
+
+        Returns:
+            bool: whether a mail was processed, successfully or not
+        """
+        with closing(self._connect()) as connection:
+            row = self._claim(connection)
+            if row is None:
+                return False
+
+            mail_id, payload, attempts = row
+            attempts += 1
+
+            try:
+                self.sender(**json.loads(payload))
+            # pylint: disable-next=W0718
+            except Exception as e:
+                status = DEAD if attempts >= self.max_attempts else PENDING
+                connection.execute(
+                    "UPDATE mails SET status = ?, attempts = ?, "
+                    "next_attempt = ?, claimed_at = NULL, last_error = ? "
+                    "WHERE id = ?",
+                    (
+                        status,
+                        attempts,
+                        time.time() + self._retry_delay(attempts),
+                        repr(e),
+                        mail_id,
+                    ),
+                )
+            else:
+                connection.execute("DELETE FROM mails WHERE id = ?", (mail_id,))
+
+        return True
+
+    def drain(self, timeout: float | None = None) -> int:
+        """Sends every mail that is currently due.
+
+        Args:
+            timeout (float, optional): seconds after which no further mail
+                is started. Waits for every due mail when None.
+                Defaults to None.
+
+        Returns:
+            int: number of processed mails
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        processed = 0
+        while (
+            deadline is None or time.monotonic() < deadline
+        ) and self.process_one():
+            processed += 1
+        return processed
+
+    def _run(self, poll_interval: float):
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            try:
+                while not self._stop.is_set() and self.process_one():
+                    pass
+            # pylint: disable-next=W0718
+            except Exception:
+                # a locked or unavailable database; try again later
+                pass
+            self._wakeup.wait(poll_interval)
+
+    def start_worker(self, poll_interval: float = 5.0):
+        "starts the background sender thread unless it is already running"
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        self._stop.clear()
+        self._worker = threading.Thread(
+            target=self._run,
+            args=(poll_interval,),
+            name="util-mail-queue",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def stop_worker(self, timeout: float | None = None):
+        "stops the background sender thread after its current mail"
+        self._stop.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            self._worker = None
+
+    def pending(self) -> int:
+        "number of mails waiting to be sent"
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT COUNT(*) FROM mails WHERE status != ?", (DEAD,)
+            ).fetchone()[0]
+
+    def dead_letters(self) -> list[dict]:
+        "returns the mails that ran out of attempts"
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT id, payload, attempts, last_error FROM mails "
+                "WHERE status = ? ORDER BY id",
+                (DEAD,),
+            ).fetchall()
+
+        return [
+            {
+                "id": mail_id,
+                "mail": json.loads(payload),
+                "attempts": attempts,
+                "error": error,
+            }
+            for mail_id, payload, attempts, error in rows
+        ]
+
+    def requeue_dead(self) -> int:
+        """Gives every dead letter a fresh set of attempts.
+
+        Returns:
+            int: number of requeued mails
+        """
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "UPDATE mails SET status = ?, attempts = 0, next_attempt = ? "
+                "WHERE status = ?",
+                (PENDING, time.time(), DEAD),
+            )
+            count = cursor.rowcount
+
+        self._wakeup.set()
+        return count
@@ -0,0 +1,160 @@
+"""Cached Outlook COM sessions.
+
+Binding to ``outlook.application`` is slow, so the application object is
+created once per thread (COM apartment) and reused for every mail sent from
+that thread. A stale object, e.g. after Outlook was restarted, is replaced
+transparently.
+
+The COM layer is reached through a dispatcher callable, which defaults to
+``win32com.client.Dispatch`` and can be swapped with `set_dispatcher`, e.g.
+for tests on machines without Outlook.
+"""
+
+import os
+import threading
+from typing import Iterable
+
+
+_local = threading.local()
+_dispatcher = None
+_generation = 0
+_lock = threading.Lock()
+
+
+def _default_dispatcher():
+    "binds to Outlook from the calling thread"
+    # pylint: disable-next=C0415
+    import pythoncom
+    # pylint: disable-next=C0415
+    import win32com.client as win32
+
+    # every thread has to join a COM apartment before using COM objects
+    pythoncom.CoInitialize()
+
+    return win32.Dispatch('outlook.application')
+
+
+def set_dispatcher(dispatcher=None):
+    """Replaces the callable creating the Outlook application object.
+
+    Cached applications of every thread are dropped. Passing None restores
+    the default win32com dispatcher.
+    """
+    global _dispatcher, _generation  # pylint: disable=W0603
+
+    with _lock:
+        _dispatcher = dispatcher
+        _generation += 1
+
+
+def get_application(refresh: bool = False):
+    """Returns the Outlook application object of the calling thread.
+
+    Args:
+        refresh (bool, optional): drop the cached object and bind again.
+            Defaults to False.
+    """
+    application = getattr(_local, "application", None)
+
+    if (
+        refresh
+        or application is None
+        or getattr(_local, "generation", None) != _generation
+    ):
+        with _lock:
+            dispatcher = _dispatcher or _default_dispatcher
+            generation = _generation
+
+        application = dispatcher()
+        _local.application = application
+        _local.generation = generation
+
+    return application
+
+
+def reset():
+    "drops the cached application object of the calling thread"
+    _local.application = None
+
+
+def _create_mail(
+        application,
+        subject: str,
+        message: str,
+        recipients: list[str],
+        mail_type: str = "plain",
+        attachments: list[str] = None,
+        cc: list[str] = None,
+        bcc: list[str] = None,
+):
+    if mail_type not in ("plain", "html"):
+        raise ValueError(
+            "Invalid mail type. Choose 'plain' or 'html'.")
+
+    # for email in recipients:
+    mail = application.CreateItem(0)
+
+    mail.To = ";".join(recipients)
+    if cc:
+        mail.CC = ";".join(cc)
+
+    if bcc:
+        mail.BCC = ";".join(bcc)
+
+    mail.Subject = str(subject)
+
+    for path in attachments or []:
+        mail.Attachments.Add(os.path.abspath(path))
+
+    if mail_type == "plain":
+        mail.Body = str(message)
+    else:
+        mail.HTMLBody = str(message)
+
+    return mail
+
+
+def send(**mail):
+    """Sends one mail through the cached application of the calling thread.
+
+    If the cached application fails, it is bound again and the mail is
+    retried once.
+
+    Args:
+        **mail: subject, message, recipients and optionally mail_type,
+            attachments, cc and bcc.
+    """
+    try:
+        item = _create_mail(get_application(), **mail)
+    except ValueError:
+        raise
+    # pylint: disable-next=W0718
+    except Exception:
+        # stale application object, e.g. Outlook was restarted
+        item = _create_mail(get_application(refresh=True), **mail)
+
+    item.Send()
+
+
+def send_many(mails: Iterable[dict]) -> list[Exception | None]:
+    """Sends several mails over one application object.
+
+    Args:
+        mails (Iterable[dict]): keyword arguments of `send` for every mail
+
+    Returns:
+        list[Exception | None]: the error of every mail, None when it was
+            sent, in input order
+    """
+    errors = []
+
+    for mail in mails:
+        try:
+            send(**mail)
+        # pylint: disable-next=W0718
+        except Exception as e:
+            errors.append(e)
+        else:
+            errors.append(None)
+
+    return errors
@@ -0,0 +1,212 @@
+"""Token-bucket rate limiting for outgoing mail.
+
+A bucket holds up to ``burst`` tokens and is refilled at ``rate`` tokens per
+second. Sending a message takes one token, and a caller only waits when the
+bucket is empty. A bucket can keep its state in a file so that every thread
+and process of the user on the host draws from the same budget.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from warnings import warn
+from util.files import FileLock
+
+
+class TokenBucket:
+    """Thread-safe, optionally host-wide, adaptive token bucket.
+
+    The effective rate drops multiplicatively on `backoff` (for example
+    when the server answers 421/451) and climbs back additively towards
+    ``rate`` on every `recover`.
+
+    Args:
+        rate (float): tokens added per second.
+        burst (int, optional): bucket capacity. Defaults to 1.
+        state_path (str, optional): file holding the shared state. When
+            None, or once the file cannot be used, the bucket only lives in
+            this process. Defaults to None.
+        min_rate (float, optional): floor for the adaptive rate.
+            Defaults to a tenth of ``rate``.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        state_path: str | None = None,
+        min_rate: float | None = None,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+
+        self.rate = float(rate)
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else self.rate / 10
+        self.state_path = state_path
+
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(state_path + ".lock") if state_path else None
+        self._state = self._initial_state()
+
+    def _initial_state(self) -> dict:
+        return {
+            "tokens": float(self.burst),
+            "stamp": self._now(),
+            "rate": self.rate,
+        }
+
+    def _now(self) -> float:
+        # wall clock is the only clock shared between processes
+        return time.time() if self.state_path else time.monotonic()
+
+    def _load(self) -> dict:
+        if not self.state_path:
+            return self._state
+
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return self._initial_state()
+
+        # settings may have changed since the file was written
+        state["rate"] = min(max(state["rate"], self.min_rate), self.rate)
+        state["tokens"] = min(state["tokens"], float(self.burst))
+        return state
+
+    def _save(self, state: dict):
+        if not self.state_path:
+            self._state = state
+            return
+
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    def _apply(self, change):
+        state = self._load()
+        now = self._now()
+        elapsed = max(0.0, now - state["stamp"])
+        state["tokens"] = min(
+            float(self.burst),
+            state["tokens"] + elapsed * state["rate"],
+        )
+        state["stamp"] = now
+        result = change(state)
+        self._save(state)
+        return result
+
+    def _detach(self, error: OSError):
+        "falls back to a bucket of this process only"
+        warn(f"Rate limit state {self.state_path} is not usable ({error}), "
+             "limiting this process only")
+        self.state_path = None
+        self._file_lock = None
+        self._state = self._initial_state()
+
+    def _update(self, change):
+        "refills the bucket, applies ``change`` to the state and stores it"
+        with self._lock:
+            if self._file_lock:
+                try:
+                    with self._file_lock:
+                        return self._apply(change)
+                except OSError as e:
+                    self._detach(e)
+            return self._apply(change)
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Takes ``tokens`` if available.
+
+        Returns:
+            float: 0 when the tokens were taken, otherwise the number of
+            seconds after which they will be available.
+        """
+        def change(state):
+            if state["tokens"] >= tokens:
+                state["tokens"] -= tokens
+                return 0.0
+            return (tokens - state["tokens"]) / state["rate"]
+
+        return self._update(change)
+
+    def acquire(self, tokens: float = 1):
+        "blocks until ``tokens`` could be taken"
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def backoff(self, factor: float = 0.5):
+        "reduces the effective rate, e.g. after the server asked to slow down"
+        def change(state):
+            state["rate"] = max(self.min_rate, state["rate"] * factor)
+
+        self._update(change)
+
+    def recover(self, fraction: float = 0.1):
+        "moves the effective rate back towards the configured rate"
+        def change(state):
+            state["rate"] = min(self.rate, state["rate"] + self.rate * fraction)
+
+        self._update(change)
+
+    @property
+    def current_rate(self) -> float:
+        "effective rate after back-pressure adjustments"
+        return self._update(lambda state: state["rate"])
+
+
+def _state_dir() -> str | None:
+    "returns a temp directory private to the current user, None if unusable"
+    directory = tempfile.gettempdir()
+    # the temp directory is per user on Windows, but shared on POSIX
+    if hasattr(os, "getuid"):
+        directory = os.path.join(directory, f"util-{os.getuid()}")
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            if os.stat(directory).st_uid != os.getuid():
+                return None
+        except OSError:
+            return None
+    return directory
+
+
+_buckets: dict[tuple, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(
+    name: str,
+    rate: float,
+    burst: int = 1,
+    shared: bool = True,
+) -> TokenBucket:
+    """Returns the process wide bucket for ``name`` and settings.
+
+    Shared buckets keep their state in a directory of the current user in
+    the temp directory, so every process of the user using the same ``name``,
+    ``rate`` and ``burst`` draws from one budget. Buckets with other settings
+    get their own file, so that they do not overwrite each other's rate.
+    When that directory cannot be created, the bucket only lives in this
+    process.
+    """
+    key = (name, rate, burst, shared)
+
+    with _buckets_lock:
+        if key not in _buckets:
+            state_path = None
+            if shared:
+                safe_name = "".join(
+                    char if char.isalnum() else "_" for char in name)
+                directory = _state_dir()
+                if directory:
+                    state_path = os.path.join(
+                        directory, f"util-{safe_name}-{rate:g}-{burst}.bucket")
+            _buckets[key] = TokenBucket(rate, burst, state_path=state_path)
+        return _buckets[key]
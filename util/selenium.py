@@ -5,15 +5,23 @@ import re
 import time
 import shutil
 import platform
+import json
+import threading
+import weakref
 from enum import Enum
+from typing import Any, Callable, Iterable, NamedTuple
+from functools import partial
+from contextlib import contextmanager
 from zipfile import ZipFile
 from pathlib import Path
 from warnings import warn
+from urllib.parse import quote
 import requests
 
 # Selenium install check
 try:
     from selenium import webdriver
+    from selenium.common.exceptions import WebDriverException
 except ImportError as e:
     raise ImportError("Selenium library not found.\n"
     "Please install it using pip: `pip install selenium`") from e
@@ -25,6 +33,75 @@ class Browser(Enum):
     EDGE="edge"
 
 
+class DriverProfile(Enum):
+    "performance presets of `init_driver`, from full pages to bare HTML"
+    DEFAULT="default"
+    EAGER="eager"
+    LIGHT="light"
+    BLOCKING="blocking"
+    MINIMAL="minimal"
+
+
+AD_URL_PATTERNS = [
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*googleadservices.com*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*facebook.net*",
+    "*hotjar.com*",
+    "*scorecardresearch.com*",
+    "*adnxs.com*",
+    "*taboola.com*",
+    "*outbrain.com*",
+]
+FONT_URL_PATTERNS = ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"]
+STYLE_URL_PATTERNS = ["*.css", "*.css?*"]
+MEDIA_URL_PATTERNS = ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"]
+
+# page_load_strategy: when driver.get returns, "normal" (load event),
+#   "eager" (DOM ready) or "none" (right after the navigation started)
+# images/fonts: whether they are downloaded at all
+# lean: extensions and GPU acceleration off
+# maximize: maximize the window after start
+# blocked_urls: URL patterns with * wildcards which are never requested
+_PROFILES = {
+    DriverProfile.DEFAULT: {
+        "page_load_strategy": "normal", "images": True, "fonts": True,
+        "lean": False, "maximize": True, "blocked_urls": [],
+    },
+    DriverProfile.EAGER: {
+        "page_load_strategy": "eager", "images": True, "fonts": True,
+        "lean": True, "maximize": False, "blocked_urls": [],
+    },
+    DriverProfile.LIGHT: {
+        "page_load_strategy": "eager", "images": False, "fonts": False,
+        "lean": True, "maximize": False, "blocked_urls": [],
+    },
+    DriverProfile.BLOCKING: {
+        "page_load_strategy": "eager", "images": False, "fonts": False,
+        "lean": True, "maximize": False, "blocked_urls": AD_URL_PATTERNS,
+    },
+    DriverProfile.MINIMAL: {
+        "page_load_strategy": "none", "images": False, "fonts": False,
+        "lean": True, "maximize": False,
+        "blocked_urls": AD_URL_PATTERNS + STYLE_URL_PATTERNS + MEDIA_URL_PATTERNS,
+    },
+}
+
+
+def _pac_url(patterns: list[str]) -> str:
+    "returns a proxy auto-config data URL sending ``patterns`` to a dead port"
+    conditions = " || ".join(
+        f"shExpMatch(url, {json.dumps(pattern)})" for pattern in patterns)
+    script = (
+        "function FindProxyForURL(url, host) {"
+        f" if ({conditions}) return 'PROXY 127.0.0.1:9';"
+        " return 'DIRECT'; }"
+    )
+    return "data:text/javascript," + quote(script)
+
+
 def _driver_name_regex(browser: Browser):
     "returns the regex pattern for the driver name"
     match browser:
@@ -154,57 +231,24 @@ def _verify_driver(driver_dir: str | os.PathLike, browser: Browser):
         _download_driver(driver_dir, browser)
 
 
-def init_driver(
-    browser: Browser = Browser.FIREFOX,
-    driver_download_dir: str = None,
+def _driver_options(
+    browser: Browser,
     user_data_dir: str = None,
     download_dir: str = None,
     headless: bool = False,
-    driver_dir: str = None,
-) -> webdriver:
-    """
-    Initialize a webdriver for the specified browser.
-
-
-    """
-
-    if driver_download_dir:
-        warn("FutureWarning: Use of driver_download_dir is deprecated. Selenium handles it internally after version ^4")
-    if driver_dir:
-        warn("FutureWarning: Use of driver_dir is deprecated. Selenium handles it internally after version ^4")
-        # driver_dir = driver_download_dir
-
-    # driver_path = None
-    driver = None
+    settings: dict = None,
+    blocked_urls: list[str] = None,
+):
+    "returns the selenium options of `init_driver`"
+    settings = settings or _PROFILES[DriverProfile.DEFAULT]
     options = None
-    service = None
-
-    # if driver_dir is None:
-    #     driver_dir = os.getcwd()
-
-    # # safeguard
-    # match browser:
-    #     case Browser.EDGE:
-    #         raise NotImplementedError("Service for Edge browser is not implemented yet.")
-
-    # download driver if not already downloaded
-    # _verify_driver(driver_dir, browser)
-
-    # # handling data_path
-    # files = os.listdir(driver_dir)
-    # for file in files:
-    #     if re.search(_driver_name_regex(browser), file):
-    #         driver_path = os.path.join(driver_dir, file)
-    #         break
-
-    # assert driver_path is not None, "No driver executable found."
 
-    # Setup Options
     match browser:
         case Browser.FIREFOX:
             from selenium.webdriver.firefox.options import Options
 
             options = Options()
+            options.page_load_strategy = settings["page_load_strategy"]
             if headless:
                 options.add_argument("--headless")
             if user_data_dir:
@@ -231,11 +275,27 @@ def init_driver(
                     "application/download, "
                     "application/octet-stream",
                 )
+            if not settings["images"]:
+                options.set_preference("permissions.default.image", 2)
+            if not settings["fonts"]:
+                options.set_preference("browser.display.use_document_fonts", 0)
+                options.set_preference("gfx.downloadable_fonts.enabled", False)
+            if settings["lean"]:
+                options.set_preference("layers.acceleration.disabled", True)
+            if blocked_urls:
+                options.set_preference("network.proxy.type", 2)
+                options.set_preference(
+                    "network.proxy.autoconfig_url", _pac_url(blocked_urls))
+                # match https URLs on their path too, not only the host
+                options.set_preference(
+                    "network.proxy.autoconfig_url.include_path", True)
 
         case Browser.CHROME:
             from selenium.webdriver.chrome.options import Options
 
             options = Options()
+            options.page_load_strategy = settings["page_load_strategy"]
+            prefs = {}
             if headless:
                 options.add_argument("--headless")
             if user_data_dir:
@@ -244,9 +304,99 @@ def init_driver(
 
                 options.add_argument(f'--user-data-dir={user_data_dir}')
             if download_dir:
-                prefs = {'download.default_directory' : download_dir}
+                prefs['download.default_directory'] = download_dir
+            if not settings["images"]:
+                options.add_argument("--blink-settings=imagesEnabled=false")
+                prefs["profile.managed_default_content_settings.images"] = 2
+            if settings["lean"]:
+                options.add_argument("--disable-extensions")
+                options.add_argument("--disable-gpu")
+            if prefs:
                 options.add_experimental_option('prefs', prefs)
 
+    return options
+
+
+def init_driver(
+    browser: Browser = Browser.FIREFOX,
+    driver_download_dir: str = None,
+    user_data_dir: str = None,
+    download_dir: str = None,
+    headless: bool = False,
+    driver_dir: str = None,
+    profile: DriverProfile | str = DriverProfile.DEFAULT,
+    blocked_urls: list[str] = None,
+) -> webdriver:
+    """
+    Initialize a webdriver for the specified browser.
+
+    `profile` selects a performance preset, see `DriverProfile`:
+
+    - DEFAULT: full page loads and a maximized window
+    - EAGER: `driver.get` returns once the DOM is ready, no extensions,
+      no GPU and no maximized window
+    - LIGHT: EAGER without images and web fonts
+    - BLOCKING: LIGHT without ad and analytics requests
+    - MINIMAL: BLOCKING without stylesheets and media, and `driver.get`
+      returns right after the navigation started
+
+    Args:
+        profile (DriverProfile | str, optional): performance preset.
+            Defaults to DriverProfile.DEFAULT.
+        blocked_urls (list[str], optional): additional URL patterns with `*`
+            wildcards which are never requested, e.g. "*.css".
+            Chrome blocks them in the first tab only. Defaults to None.
+    """
+
+    if driver_download_dir:
+        warn("FutureWarning: Use of driver_download_dir is deprecated. Selenium handles it internally after version ^4")
+    if driver_dir:
+        warn("FutureWarning: Use of driver_dir is deprecated. Selenium handles it internally after version ^4")
+        # driver_dir = driver_download_dir
+
+    # driver_path = None
+    driver = None
+    options = None
+    service = None
+
+    # if driver_dir is None:
+    #     driver_dir = os.getcwd()
+
+    # # safeguard
+    # match browser:
+    #     case Browser.EDGE:
+    #         raise NotImplementedError("Service for Edge browser is not implemented yet.")
+
+    # download driver if not already downloaded
+    # _verify_driver(driver_dir, browser)
+
+    # # handling data_path
+    # files = os.listdir(driver_dir)
+    # for file in files:
+    #     if re.search(_driver_name_regex(browser), file):
+    #         driver_path = os.path.join(driver_dir, file)
+    #         break
+
+    # assert driver_path is not None, "No driver executable found."
+
+    if isinstance(profile, str):
+        profile = DriverProfile(profile)
+    settings = _PROFILES[profile]
+    patterns = settings["blocked_urls"] + list(blocked_urls or [])
+    if not settings["fonts"] and browser == Browser.CHROME:
+        # Chrome has no switch for web fonts, so their requests are blocked
+        patterns += FONT_URL_PATTERNS
+
+    # Setup Options
+    options = _driver_options(
+        browser,
+        user_data_dir=user_data_dir,
+        download_dir=download_dir,
+        headless=headless,
+        settings=settings,
+        blocked_urls=patterns,
+    )
+
     # Setup Service
     match browser:
         case Browser.FIREFOX:
@@ -278,7 +428,12 @@ def init_driver(
 
     assert driver is not None, "No webdriver generated."
 
-    driver.maximize_window()
+    if patterns and browser == Browser.CHROME:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+    if settings["maximize"]:
+        driver.maximize_window()
 
     return driver
 
@@ -325,3 +480,480 @@ def get_profile_path(browser: Browser) -> str:
                 assert os.path.exists(profile_path), "No Chrome profile found."
 
     return profile_path
+
+
+def _quit_driver(driver):
+    "quits a driver, ignoring errors from an already crashed browser"
+    try:
+        driver.quit()
+    # pylint: disable-next=W0718
+    except Exception:
+        pass
+
+
+def reset_driver(driver) -> bool:
+    """Brings a driver back to a blank state for the next task.
+
+    Closes every window but the first, clears the cookies and the web
+    storage and navigates to about:blank. Chromium based drivers clear the
+    cookies of every site, other browsers only the ones of the current site.
+
+    Returns:
+        bool: False when the browser no longer responds
+    """
+    try:
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+
+        try:
+            driver.execute_script(
+                "window.localStorage.clear(); window.sessionStorage.clear();")
+        except WebDriverException:
+            # pages like about:blank have no storage
+            pass
+
+        driver.delete_all_cookies()
+        if hasattr(driver, "execute_cdp_cmd"):
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+
+        driver.get("about:blank")
+    except WebDriverException:
+        return False
+
+    return True
+
+
+def _quit_all(*groups):
+    "quits the drivers left in ``groups`` once their owner is gone"
+    for driver in [driver for group in groups for driver in group]:
+        if driver is not None:
+            _quit_driver(driver)
+
+
+class DriverPool:
+    """Thread-safe pool of pre-started webdrivers.
+
+    Starting a browser takes seconds, so the pool starts ``size`` drivers
+    up front and lends them out with `lease`. Between two leases a driver
+    is reset with `reset_driver`. Drivers are replaced after ``max_uses``
+    leases, when the lease raised a ``WebDriverException`` or when the
+    reset fails, e.g. because the browser crashed. Every idle driver is
+    quit by `close`. When the pool is garbage collected or the interpreter
+    exits, the drivers still lent out are quit as well.
+
+    Args:
+        size (int, optional): Maximum number of drivers, including the ones
+            currently lent out. Defaults to 2.
+        max_uses (int, optional): Leases after which a driver is replaced.
+            None never replaces healthy drivers. Defaults to 50.
+        prewarm (bool, optional): Start every driver in the constructor,
+            in parallel. Otherwise they are started on demand.
+            Defaults to True.
+        factory (callable, optional): Callable without arguments returning
+            a new driver. Defaults to `init_driver` with ``driver_options``.
+        **driver_options: Arguments of `init_driver`, e.g. browser and
+            headless.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_uses: int | None = 50,
+        prewarm: bool = True,
+        factory=None,
+        **driver_options,
+    ):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+
+        self.size = size
+        self.max_uses = max_uses
+        self.factory = factory or partial(init_driver, **driver_options)
+
+        self._idle: list = []
+        self._leased: dict[int, Any] = {}
+        self._uses: dict[int, int] = {}
+        self._count = 0
+        self._condition = threading.Condition()
+        self._closed = False
+
+        # holds the containers only, so that the pool can be collected
+        weakref.finalize(self, _quit_all, self._idle, self._leased.values())
+
+        if prewarm:
+            self._prewarm()
+
+    def _prewarm(self):
+        "starts every driver at once, since each start mostly waits"
+        # pylint: disable-next=C0415
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._condition:
+            missing = self.size - self._count
+            self._count += missing
+
+        with ThreadPoolExecutor(max_workers=missing or 1) as executor:
+            futures = [executor.submit(self.factory) for _ in range(missing)]
+
+        drivers, error = [], None
+        for future in futures:
+            try:
+                drivers.append(future.result())
+            # pylint: disable-next=W0718
+            except Exception as e:
+                error = error or e
+
+        with self._condition:
+            self._count -= missing - len(drivers)
+            for driver in drivers:
+                self._uses[id(driver)] = 0
+                self._idle.append(driver)
+            self._condition.notify_all()
+
+        if error is not None:
+            self.close()
+            raise error
+
+    def acquire(self, timeout: float | None = None):
+        """Takes a driver out of the pool, starting one when needed.
+
+        Prefer `lease`, which always gives the driver back.
+
+        Raises:
+            TimeoutError: If no driver became free within ``timeout``
+                seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+
+                if self._idle:
+                    driver = self._idle.pop()
+                    self._leased[id(driver)] = driver
+                    return driver
+
+                if self._count < self.size:
+                    self._count += 1
+                    break
+
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("No driver became free in time")
+                self._condition.wait(remaining)
+
+        try:
+            driver = self.factory()
+        except BaseException:
+            with self._condition:
+                self._count -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._uses[id(driver)] = 0
+            self._leased[id(driver)] = driver
+        return driver
+
+    def release(self, driver, broken: bool = False):
+        """Gives a driver back to the pool.
+
+        Args:
+            driver: a driver returned by `acquire`.
+            broken (bool, optional): quit the driver instead of reusing it.
+                Defaults to False.
+        """
+        with self._condition:
+            self._leased.pop(id(driver), None)
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+            retire = (
+                broken
+                or self._closed
+                or (self.max_uses is not None and uses >= self.max_uses)
+            )
+
+        if not retire and not reset_driver(driver):
+            retire = True
+
+        if retire:
+            _quit_driver(driver)
+
+        with self._condition:
+            if retire:
+                self._uses.pop(id(driver), None)
+                self._count -= 1
+            else:
+                self._idle.append(driver)
+            self._condition.notify()
+
+    @contextmanager
+    def lease(self, timeout: float | None = None):
+        """Lends out a driver for the duration of the block.
+
+        If the block raises a ``WebDriverException`` the driver is replaced,
+        since the browser is likely in a bad state.
+
+        Args:
+            timeout (float, optional): seconds to wait for a free driver.
+                Waits forever when None. Defaults to None.
+        """
+        driver = self.acquire(timeout)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken)
+
+    def close(self):
+        "quits every idle driver, leased ones are quit when given back"
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._count -= len(idle)
+            self._condition.notify_all()
+
+        for driver in idle:
+            _quit_driver(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        "number of started drivers, idle or lent out"
+        with self._condition:
+            return self._count
+
+
+class ScrapeResult(NamedTuple):
+    "outcome of one job of `ScrapeExecutor.run`"
+    index: int
+    url: str | None
+    value: Any
+    error: Exception | None
+    attempts: int
+
+
+class ScrapeExecutor:
+    """Runs scraping jobs in parallel, one browser per worker thread.
+
+    A job is a ``(url, callable)`` pair: the worker's driver loads the url
+    and the callable is called with the driver, its return value being the
+    result of the job. Each browser is its own process, so worker threads
+    scale with the number of cores like processes would, while the results
+    stay plain Python objects.
+
+    Every worker downloads into its own ``download_dir/worker-<n>``
+    subfolder, so concurrent downloads never mix. Browsers are started on
+    first use, kept between `run` calls, reset between two jobs and
+    restarted when they crash. They are quit by `close`, or when the
+    executor is garbage collected or the interpreter exits.
+
+    An attempt running longer than ``job_timeout`` is stopped by quitting
+    its browser, which makes the pending driver call of the job fail. The
+    attempt then counts as failed with a ``TimeoutError`` and the worker
+    starts a new browser.
+
+    Args:
+        workers (int, optional): Number of browsers running at once.
+            Defaults to 4.
+        download_dir (str, optional): Parent folder of the download folders
+            of the workers. Defaults to None.
+        retries (int, optional): Extra attempts of a failing job.
+            Defaults to 1.
+        timeout (float, optional): Page load and script timeout of every
+            attempt, in seconds. None keeps the driver defaults.
+            Defaults to 60.
+        job_timeout (float, optional): Seconds an attempt, loading the url
+            and calling the job, may take. None never stops a job.
+            Defaults to 300.
+        factory (callable, optional): Callable taking ``download_dir`` and
+            returning a new driver. Defaults to `init_driver` with
+            ``driver_options``.
+        **driver_options: Arguments of `init_driver`. headless defaults to
+            True.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        download_dir: str | None = None,
+        retries: int = 1,
+        timeout: float | None = 60.0,
+        job_timeout: float | None = 300.0,
+        factory=None,
+        **driver_options,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        driver_options.setdefault("headless", True)
+
+        self.workers = workers
+        self.download_dir = download_dir
+        self.retries = retries
+        self.timeout = timeout
+        self.job_timeout = job_timeout
+        self.factory = factory or partial(init_driver, **driver_options)
+
+        self._drivers: list = [None] * workers
+        weakref.finalize(self, _quit_all, self._drivers)
+
+    def _worker_download_dir(self, worker: int) -> str | None:
+        if self.download_dir is None:
+            return None
+        path = os.path.abspath(
+            os.path.join(self.download_dir, f"worker-{worker}"))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _driver(self, worker: int):
+        "returns the driver of a worker, starting it when needed"
+        driver = self._drivers[worker]
+        if driver is None:
+            driver = self.factory(
+                download_dir=self._worker_download_dir(worker))
+            if self.timeout is not None:
+                driver.set_page_load_timeout(self.timeout)
+                driver.set_script_timeout(self.timeout)
+            self._drivers[worker] = driver
+        return driver
+
+    def _restart(self, worker: int):
+        "quits the driver of a worker, the next job starts a new one"
+        driver, self._drivers[worker] = self._drivers[worker], None
+        if driver is not None:
+            _quit_driver(driver)
+
+    def _start_deadline(self, driver, expired: threading.Event):
+        "quits ``driver`` and sets ``expired`` once job_timeout has passed"
+        if self.job_timeout is None:
+            return None
+
+        def expire():
+            expired.set()
+            _quit_driver(driver)
+
+        timer = threading.Timer(self.job_timeout, expire)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _run_job(
+        self, worker: int, index: int, url: str | None, job: Callable,
+    ) -> ScrapeResult:
+        error = None
+
+        for attempt in range(1, self.retries + 2):
+            driver, timer = None, None
+            expired = threading.Event()
+            try:
+                driver = self._driver(worker)
+                timer = self._start_deadline(driver, expired)
+                if url:
+                    driver.get(url)
+                value = job(driver)
+            # pylint: disable-next=W0718
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                    # waits for a quit that is already running
+                    timer.join()
+
+            if expired.is_set():
+                error = TimeoutError(
+                    f"Job {index} took more than {self.job_timeout} seconds")
+                self._restart(worker)
+                continue
+
+            if driver is not None and not reset_driver(driver):
+                self._restart(worker)
+            if error is None:
+                return ScrapeResult(index, url, value, None, attempt)
+
+        return ScrapeResult(index, url, None, error, self.retries + 1)
+
+    def run(
+        self, jobs: Iterable[tuple[str | None, Callable]]
+    ) -> list[ScrapeResult]:
+        """Runs every job and waits for all of them.
+
+        Failed jobs do not stop the others, their error is reported in the
+        result instead.
+
+        Args:
+            jobs (Iterable[tuple[str | None, Callable]]): url and callable
+                of every job. With a None url the callable navigates itself.
+
+        Returns:
+            list[ScrapeResult]: the result of every job, in input order
+        """
+        jobs = list(jobs)
+        results: list[ScrapeResult | None] = [None] * len(jobs)
+        next_job = iter(range(len(jobs)))
+        lock = threading.Lock()
+
+        def _work(worker: int):
+            while True:
+                with lock:
+                    index = next(next_job, None)
+                if index is None:
+                    return
+                url, job = jobs[index]
+                results[index] = self._run_job(worker, index, url, job)
+
+        threads = [
+            threading.Thread(target=_work, args=(worker,), daemon=True)
+            for worker in range(min(self.workers, len(jobs)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def close(self):
+        "quits every browser"
+        for worker in range(self.workers):
+            self._restart(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def scrape(
+    jobs: Iterable[tuple[str | None, Callable]],
+    workers: int = 4,
+    **executor_options,
+) -> list[ScrapeResult]:
+    """Runs scraping jobs on ``workers`` browsers and quits them afterwards.
+
+    See `ScrapeExecutor` for the options.
+
+    Returns:
+        list[ScrapeResult]: the result of every job, in input order
+    """
+    with ScrapeExecutor(workers, **executor_options) as executor:
+        return executor.run(jobs)
@@ -0,0 +1,354 @@
+"""Pooled, persistent SMTP sessions.
+
+Opening an SMTP session costs a TCP connect, a TLS handshake, EHLO and a
+login. This module keeps authenticated sessions alive and lends them out to
+callers so that consecutive mails reuse the same session.
+"""
+
+import re
+import ssl
+import time
+import atexit
+import smtplib
+import threading
+from functools import partial
+from contextlib import contextmanager
+from email.message import Message
+from util.attachments import iter_bytes
+
+
+_LINE_END = re.compile(rb"\r\n|\n|\r(?!\n)")
+
+
+def _default_factory(
+    host: str,
+    port: int,
+    username: str | None,
+    password: str | None,
+    timeout: float = 30.0,
+) -> smtplib.SMTP:
+    "opens, secures and authenticates a new SMTP session"
+    if int(port) == 587:
+        context = ssl.create_default_context()
+        server = smtplib.SMTP(host, port, timeout=timeout)
+        server.starttls(context=context)
+    else:
+        server = smtplib.SMTP_SSL(host, port, timeout=timeout)
+
+    server.ehlo()
+    server.login(username, password)
+
+    return server
+
+
+def _quit(server):
+    "closes a session, ignoring errors from an already dead connection"
+    try:
+        server.quit()
+    # pylint: disable-next=W0718
+    except Exception:
+        try:
+            server.close()
+        # pylint: disable-next=W0718
+        except Exception:
+            pass
+
+
+def _data(chunks):
+    "yields ``chunks`` with CRLF line ends and dot-stuffing, ending the DATA"
+    pending, line_start, data = b"", True, None
+
+    for chunk in chunks:
+        chunk, pending = pending + chunk, b""
+        # a CR at the end may start a CRLF split between two chunks
+        if chunk.endswith(b"\r"):
+            chunk, pending = chunk[:-1], b"\r"
+        if not chunk:
+            continue
+
+        data = _LINE_END.sub(b"\r\n", chunk).replace(b"\n.", b"\n..")
+        if line_start and data.startswith(b"."):
+            data = b"." + data
+        line_start = data.endswith(b"\n")
+        yield data
+
+    # like smtplib, an empty message still gets a CRLF before the final dot
+    ends_line = line_start and not pending and data is not None
+    yield (b"" if ends_line else b"\r\n") + b".\r\n"
+
+
+def _reset(server):
+    "aborts the current transaction, ignoring a dropped connection"
+    try:
+        server.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
+
+
+def send_message(server: smtplib.SMTP, from_addr: str, to_addrs: list[str],
+                 msg: Message) -> dict:
+    """Sends ``msg`` like ``server.sendmail``, but streams it to the server.
+
+    The message is written in pieces by `util.attachments.iter_bytes`, so
+    the whole message is never held in memory as one string.
+
+    Returns:
+        dict: refused recipients, as returned by ``smtplib.SMTP.sendmail``
+    """
+    server.ehlo_or_helo_if_needed()
+
+    code, response = server.mail(from_addr)
+    if code != 250:
+        if code == 421:
+            server.close()
+        else:
+            _reset(server)
+        raise smtplib.SMTPSenderRefused(code, response, from_addr)
+
+    refused = {}
+    for address in to_addrs:
+        code, response = server.rcpt(address)
+        if code not in (250, 251):
+            refused[address] = (code, response)
+        if code == 421:
+            server.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(to_addrs):
+        _reset(server)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, response = server.docmd("data")
+    if code != 354:
+        _reset(server)
+        raise smtplib.SMTPDataError(code, response)
+
+    for data in _data(iter_bytes(msg)):
+        server.send(data)
+
+    code, response = server.getreply()
+    if code != 250:
+        if code == 421:
+            server.close()
+        else:
+            _reset(server)
+        raise smtplib.SMTPDataError(code, response)
+
+    return refused
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of authenticated SMTP sessions.
+
+    Sessions are keyed by ``(host, port, username)`` so that changing the
+    module level smtp settings never hands out a session authenticated as
+    somebody else. Idle sessions older than ``idle_timeout`` seconds are
+    closed instead of being reused.
+
+    Args:
+        max_size (int, optional): Maximum number of sessions kept per key,
+            including the ones currently lent out. Defaults to 4.
+        idle_timeout (float, optional): Seconds after which an unused
+            session is discarded. Defaults to 60.
+        factory (callable, optional): Callable taking
+            ``(host, port, username, password)`` and returning a logged in
+            ``smtplib.SMTP`` like object. Defaults to a STARTTLS/SSL login.
+        timeout (float, optional): Socket timeout in seconds of the sessions
+            opened by the default factory, so that a stalled server cannot
+            hang a send. Defaults to 30.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 4,
+        idle_timeout: float = 60.0,
+        factory=None,
+        timeout: float = 30.0,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.factory = factory or partial(_default_factory, timeout=timeout)
+
+        self._idle: dict[tuple, list[tuple[float, smtplib.SMTP]]] = {}
+        self._in_use: dict[tuple, int] = {}
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def _evict_expired(self, key: tuple) -> list:
+        "removes expired idle sessions of ``key`` and returns them"
+        now = time.monotonic()
+        idle = self._idle.get(key, [])
+        fresh = [
+            item for item in idle
+            if now - item[0] < self.idle_timeout
+        ]
+        expired = [item[1] for item in idle if item not in fresh]
+        self._idle[key] = fresh
+        return expired
+
+    def _checkout(self, key: tuple, fresh: bool = False):
+        """returns an idle session for ``key`` or None if one must be opened
+
+        With ``fresh``, idle sessions are skipped and None is returned.
+        """
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("SMTP connection pool is closed")
+
+                expired = self._evict_expired(key)
+                if not expired:
+                    idle = self._idle[key]
+                    if idle and not fresh:
+                        self._in_use[key] = self._in_use.get(key, 0) + 1
+                        return idle.pop()[1]
+
+                    if self._in_use.get(key, 0) < self.max_size:
+                        self._in_use[key] = self._in_use.get(key, 0) + 1
+                        return None
+
+                    self._condition.wait()
+                    continue
+
+            # QUIT waits for the server, so other threads must not be
+            # blocked meanwhile
+            for server in expired:
+                _quit(server)
+
+    def _discard_idle(self, key: tuple):
+        "closes every idle session of ``key``"
+        with self._condition:
+            idle = self._idle.pop(key, [])
+        for _, server in idle:
+            _quit(server)
+
+    def _checkin(self, key: tuple, server):
+        "returns ``server`` to the pool, or drops it when it is None"
+        with self._condition:
+            self._in_use[key] -= 1
+            if server is not None:
+                if self._closed:
+                    _quit(server)
+                else:
+                    self._idle.setdefault(key, []).append(
+                        (time.monotonic(), server))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(
+        self,
+        host: str,
+        port: int,
+        username: str | None,
+        password: str | None,
+        fresh: bool = False,
+    ):
+        """Lends out a logged in session for the given credentials.
+
+        The session goes back to the pool when the block exits normally. If
+        the block raises, the session is closed and discarded, since its
+        state can no longer be trusted. With ``fresh``, a new session is
+        opened instead of reusing an idle one.
+        """
+        key = (host, int(port), username)
+        server = self._checkout(key, fresh)
+
+        try:
+            if server is None:
+                server = self.factory(host, port, username, password)
+        except BaseException:
+            self._checkin(key, None)
+            raise
+
+        try:
+            yield server
+        except BaseException:
+            _quit(server)
+            self._checkin(key, None)
+            raise
+
+        self._checkin(key, server)
+
+    def sendmail(
+        self,
+        host: str,
+        port: int,
+        username: str | None,
+        password: str | None,
+        from_addr: str,
+        to_addrs: list[str],
+        msg: str | bytes | Message,
+    ):
+        """Sends a message over a pooled session.
+
+        A ``Message`` is streamed to the server with `send_message`.
+
+        When the server has dropped the session in the meantime, the other
+        idle sessions of these credentials most likely timed out as well.
+        They are closed, and the send is retried once over a newly opened
+        session.
+        """
+        def send(server):
+            if isinstance(msg, Message):
+                return send_message(server, from_addr, to_addrs, msg)
+            return server.sendmail(from_addr, to_addrs, msg)
+
+        try:
+            with self.connection(host, port, username, password) as server:
+                return send(server)
+        except smtplib.SMTPServerDisconnected:
+            self._discard_idle((host, int(port), username))
+
+        with self.connection(
+            host, port, username, password, fresh=True,
+        ) as server:
+            return send(server)
+
+    def close(self):
+        "closes every idle session and rejects further checkouts"
+        with self._condition:
+            self._closed = True
+            idle = self._idle
+            self._idle = {}
+            self._condition.notify_all()
+
+        for sessions in idle.values():
+            for _, server in sessions:
+                _quit(server)
+
+    def __len__(self):
+        with self._condition:
+            return sum(len(sessions) for sessions in self._idle.values())
+
+
+_pool: SMTPConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SMTPConnectionPool:
+    "returns the process wide pool, creating it on first use"
+    global _pool  # pylint: disable=W0603
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPConnectionPool()
+        return _pool
+
+
+def set_pool(pool: SMTPConnectionPool | None):
+    "replaces the process wide pool, closing the previous one"
+    global _pool  # pylint: disable=W0603
+
+    with _pool_lock:
+        previous, _pool = _pool, pool
+
+    if previous is not None and previous is not pool:
+        previous.close()
+
+
+@atexit.register
+def _close_pool():
+    if _pool is not None:
+        _pool.close()
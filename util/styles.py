@@ -0,0 +1,137 @@
+"""Registry of named header style presets.
+
+A preset is defined once per process. Its openpyxl font, fill and border
+objects are built on first use and shared by every later call, and each
+workbook gets the preset as a named style, so header cells only store a
+reference to it instead of their own copy of every style attribute.
+"""
+
+import threading
+from functools import lru_cache
+from typing import NamedTuple
+
+
+NAMED_STYLE_PREFIX = "Header "
+
+
+class HeaderStyle(NamedTuple):
+    "formatting of a header row"
+    header_color: str = 'D0EFFF'
+    bold: bool = True
+    font_size: int | None = None
+    font_color: str | None = None
+
+
+_presets: dict[str, HeaderStyle] = {
+    "default": HeaderStyle(),
+    "grey": HeaderStyle(header_color='D9D9D9'),
+    "green": HeaderStyle(header_color='E2EFDA'),
+    "orange": HeaderStyle(header_color='FCE4D6'),
+    "dark": HeaderStyle(header_color='1F4E78', font_color='FFFFFF'),
+}
+_lock = threading.Lock()
+
+
+def register_header_style(
+    name: str,
+    header_color: str = 'D0EFFF',
+    bold: bool = True,
+    font_size: int | None = None,
+    font_color: str | None = None,
+) -> HeaderStyle:
+    """Defines or redefines a header style preset.
+
+    Args:
+        name (str): name used as ``preset`` by the Excel functions.
+        header_color (str, optional): RGB fill color. Defaults to 'D0EFFF'.
+        bold (bool, optional): bold font. Defaults to True.
+        font_size (int, optional): font size. Defaults to None.
+        font_color (str, optional): RGB font color. Defaults to None.
+
+    Returns:
+        HeaderStyle: the registered preset
+    """
+    style = HeaderStyle(header_color, bold, font_size, font_color)
+    with _lock:
+        _presets[name] = style
+    return style
+
+
+def get_header_style(name: str) -> HeaderStyle:
+    """Returns a registered preset.
+
+    Raises:
+        ValueError: If no preset is registered under ``name``.
+    """
+    with _lock:
+        style = _presets.get(name)
+    if style is None:
+        raise ValueError(
+            f"Unknown header style '{name}'. "
+            f"Choose one of {header_style_names()}")
+    return style
+
+
+def header_style_names() -> list[str]:
+    "returns the names of every registered preset"
+    with _lock:
+        return list(_presets)
+
+
+@lru_cache(maxsize=64)
+def components(style: HeaderStyle):
+    "returns the shared (fill, font, border) openpyxl objects of ``style``"
+    # pylint: disable-next=C0415
+    from openpyxl.styles import PatternFill, Font, Side, Border
+
+    fill = PatternFill(
+        fill_type='solid',
+        start_color=style.header_color,
+        end_color=style.header_color,
+    )
+
+    font_style = {}
+
+    if style.bold:
+        font_style['bold'] = True
+
+    if style.font_size:
+        font_style['size'] = style.font_size
+
+    if style.font_color:
+        font_style['color'] = style.font_color
+
+    side = Side(style='thin')
+    border = Border(left=side, right=side, top=side, bottom=side)
+
+    return fill, Font(**font_style), border
+
+
+def named_style(workbook, name: str) -> str:
+    """Registers a preset as a named style of an openpyxl workbook.
+
+    A named style left by an earlier run is updated when the preset changed
+    since.
+
+    Returns:
+        str: the name of the workbook style, to assign to ``cell.style``
+    """
+    # pylint: disable-next=C0415
+    from openpyxl.styles import NamedStyle
+
+    fill, font, border = components(get_header_style(name))
+    style_name = NAMED_STYLE_PREFIX + name
+
+    if style_name not in workbook.named_styles:
+        workbook.add_named_style(NamedStyle(
+            name=style_name, fill=fill, font=font, border=border))
+        return style_name
+
+    # pylint: disable-next=W0212
+    existing = workbook._named_styles[style_name]
+    if (existing.fill, existing.font, existing.border) != (fill, font, border):
+        existing.fill = fill
+        existing.font = font
+        existing.border = border
+
+    return style_name
@@ -0,0 +1,659 @@
+"""Compiled and cached markdown templates.
+
+A template file is read and split into literal and placeholder segments
+once, and reused until its mtime or size changes. Rendering then only
+formats the placeholder values and joins the segments, with the same
+results and errors as ``template.format(**data)``.
+
+`SafeTemplate` is an alternative syntax with ``{name}``, ``{nested.key}``
+and ``{name|default}`` placeholders, which keeps any other brace as is.
+
+For HTML output the markdown conversion is cached as well: the template is
+converted once with unique sentinel words in place of the placeholders,
+and a render substitutes the values into that HTML. This is only done when
+every value is plain text which cannot change the markdown structure, e.g.
+names, dates or numbers, and when sample values convert exactly like the
+sentinels. Next to punctuation, e.g. ``**{a}**s``, a value must also end
+in a letter or digit, since a trailing "." or "!" changes how markdown
+reads the delimiters. Templates with a placeholder inside ``<...>`` or
+``[...]``, where a value can turn into an autolink or a link reference, or
+after ``&``, and any other value are converted in full.
+"""
+
+import os
+import re
+import string
+import secrets
+import threading
+from html import escape as escape_html
+
+
+_formatter = string.Formatter()
+
+# values made only of these characters are rendered literally by markdown
+_INERT = re.compile(r"[^\W_]+(?:[ ,.;:?!'@/%$=+\-]+[^\W_]+)*[.!?%]?")
+# next to punctuation, e.g. "**{a}**s", a trailing "." or "!" changes how
+# markdown reads the delimiters, so such values must end in a word character
+_WORD_END = re.compile(r"[^\W_]\Z")
+_WORD_CHAR = re.compile(r"[^\W_]|\s")
+_ENTITY_START = re.compile(r"&#?\w*\Z")
+# at the start of a line, digits could start an ordered list
+_INERT_AT_LINE_START = re.compile(r"[^\W\d_]")
+_LINE_PREFIX = re.compile(r"[\s\d]*")
+# inert values the cached HTML is checked with before it is used
+_SAMPLES = (
+    "Sample text", "http://example.com/a", "jane@example.com", "Acme Inc.",
+    "Oh!", "50%",
+)
+
+_cache: dict[str, tuple] = {}
+_lock = threading.Lock()
+
+
+class Field:
+    "a placeholder of a template"
+
+    __slots__ = ("name", "conversion", "format_spec", "at_line_start", "plain")
+
+    def __init__(
+        self,
+        name: str,
+        conversion: str | None,
+        format_spec: str,
+        at_line_start: bool,
+    ):
+        self.name = name
+        self.conversion = conversion
+        self.format_spec = format_spec
+        self.at_line_start = at_line_start
+        # without attribute or index lookups get_field is a plain lookup
+        self.plain = "." not in name and "[" not in name
+
+    @property
+    def key(self) -> tuple:
+        "identifies fields which always format to the same text"
+        return (self.name, self.conversion, self.format_spec)
+
+    def format(self, data: dict) -> str:
+        "formats the value of the field like ``str.format`` does"
+        if self.plain:
+            value = data[self.name]
+        else:
+            value, _ = _formatter.get_field(self.name, (), data)
+        if self.conversion:
+            value = _formatter.convert_field(value, self.conversion)
+        return format(value, self.format_spec)
+
+
+class CompiledTemplate:
+    """A template split into literal and placeholder segments.
+
+    Args:
+        text (str): the template, in ``str.format`` syntax.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.literals: list[str] = []
+        self.fields: list[Field] = []
+        self._html: tuple[list[str], list[int]] | None = None
+        self._html_ready = False
+
+        # positional and nested fields depend on state the segments lack,
+        # so such templates are rendered with str.format
+        self.simple = True
+        # whether a field is inside "<...>" or "[...]", where markdown reads
+        # the value as an autolink or a link reference, or completes an
+        # entity such as "&#{a}"
+        self.bracketed = False
+
+        # whether only whitespace and digits precede the field on its line
+        line_start = True
+        # whether the last "<" and "[" before the field are still open
+        brackets = [False, False]
+        for literal, name, format_spec, conversion in self._parse(text):
+            if literal:
+                self._append_literal(literal)
+                line = literal.rsplit("\n", 1)[-1]
+                line_start = _LINE_PREFIX.fullmatch(line) is not None and (
+                    "\n" in literal or line_start)
+                for index, (opening, closing) in enumerate(("<>", "[]")):
+                    position = max(literal.rfind(opening), literal.rfind(closing))
+                    if position >= 0:
+                        brackets[index] = literal[position] == opening
+
+            if name is None:
+                continue
+
+            self.bracketed |= any(brackets) or (
+                len(self.literals) > len(self.fields)
+                and _ENTITY_START.search(self.literals[-1]) is not None)
+
+            if len(self.literals) == len(self.fields):
+                self.literals.append("")
+            self.fields.append(
+                self._field(name, conversion, format_spec, line_start))
+            line_start = False
+
+        if len(self.literals) == len(self.fields):
+            self.literals.append("")
+
+        # a field used several times is formatted once per render
+        unique: dict[tuple, int] = {}
+        self.positions = [
+            unique.setdefault(field.key, len(unique)) for field in self.fields
+        ]
+        self.unique_fields: list[Field] = [None] * len(unique)
+        self._line_start = [False] * len(unique)
+        # whether punctuation, "_" or another field touches the field
+        self._delimited = [False] * len(unique)
+        for index, (field, position) in enumerate(
+                zip(self.fields, self.positions)):
+            self.unique_fields[position] = field
+            self._line_start[position] |= field.at_line_start
+            before = self.literals[index][-1:] or ("{" if index else " ")
+            after = self.literals[index + 1][:1] or (
+                "{" if index + 1 < len(self.fields) else " ")
+            self._delimited[position] |= not (
+                _WORD_CHAR.match(before) and _WORD_CHAR.match(after))
+
+    def _parse(self, text: str):
+        "yields (literal, name, format_spec, conversion) like string.Formatter"
+        return _formatter.parse(text)
+
+    def _field(
+        self, name: str, conversion: str | None, format_spec: str,
+        at_line_start: bool,
+    ) -> Field:
+        first = re.split(r"[.\[]", name, maxsplit=1)[0]
+        if not first or first.isdigit() or "{" in format_spec:
+            self.simple = False
+        return Field(name, conversion, format_spec, at_line_start)
+
+    def _append_literal(self, literal: str):
+        if len(self.literals) > len(self.fields):
+            self.literals[-1] += literal
+        else:
+            self.literals.append(literal)
+
+    def _values(self, data: dict) -> list[str]:
+        "returns the text of every unique field"
+        return [field.format(data) for field in self.unique_fields]
+
+    def _join(self, literals: list[str], values: list[str], fields: list[int]):
+        "interleaves ``literals`` with the unique ``values`` at ``fields``"
+        parts = [None] * (len(literals) + len(fields))
+        parts[0::2] = literals
+        parts[1::2] = [values[index] for index in fields]
+        return "".join(parts)
+
+    def _is_inert(self, values: list[str]) -> bool:
+        "whether every unique value renders to itself wherever it is used"
+        for value, line_start, delimited in zip(
+                values, self._line_start, self._delimited):
+            if not _INERT.fullmatch(value):
+                return False
+            if line_start and not _INERT_AT_LINE_START.match(value):
+                return False
+            if delimited and not _WORD_END.search(value):
+                return False
+        return True
+
+    def render(self, data: dict | None = None) -> str:
+        "returns the template filled with ``data``"
+        if data is None:
+            data = {}
+        if not self.simple:
+            return self.text.format(**data)
+        return self._join(self.literals, self._values(data), self.positions)
+
+    def _prepare_html(self):
+        "converts the template once, with sentinel words as placeholders"
+        # pylint: disable-next=C0415
+        import markdown
+
+        if self.bracketed:
+            return
+
+        token = f"tplfield{secrets.token_hex(6)}"
+        sentinels = [f"{token}n{index}e" for index in range(len(self.fields))]
+        converted = markdown.markdown(self._join(
+            self.literals, sentinels, list(range(len(self.fields)))))
+
+        parts = re.split(f"{token}n(\\d+)e", converted)
+        fields = [int(index) for index in parts[1::2]]
+
+        # a placeholder markdown dropped or duplicated cannot be substituted
+        if sorted(fields) != list(range(len(self.fields))):
+            return
+
+        literals = parts[0::2]
+        fields = [self.positions[index] for index in fields]
+
+        # the sentinels are single words, real values may be read as URLs,
+        # e-mail addresses or several words in places they are not
+        for sample in _SAMPLES:
+            values = [
+                sample if not delimited or _WORD_END.search(sample)
+                else _SAMPLES[0]
+                for delimited in self._delimited
+            ]
+            expected = markdown.markdown(
+                self._join(self.literals, values, self.positions))
+            if self._join(literals, values, fields) != expected:
+                return
+
+        self._html = (literals, fields)
+
+    def render_html(self, data: dict | None = None) -> str:
+        "returns the template filled with ``data`` and converted to HTML"
+        # pylint: disable-next=C0415
+        import markdown
+
+        if data is None:
+            data = {}
+        if not self.simple:
+            return markdown.markdown(self.text.format(**data))
+
+        return self._html_from_values(self._values(data))
+
+    def _html_from_values(self, values: list[str]) -> str:
+        "converts the template filled with the formatted ``values`` to HTML"
+        # pylint: disable-next=C0415
+        import markdown
+
+        if not self._html_ready:
+            self._prepare_html()
+            self._html_ready = True
+
+        if self._html is not None and self._is_inert(values):
+            literals, fields = self._html
+            return self._join(literals, values, fields)
+
+        return markdown.markdown(
+            self._join(self.literals, values, self.positions))
+
+
+# "{{name}}" is an escaped placeholder, rendered as "{name}"
+_PLACEHOLDER = re.compile(
+    r"\{(\{)?([A-Za-z_]\w*(?:\.\w+)*)(?:\|([^{}\n]*))?\}(?(1)\})")
+_MISSING = object()
+
+
+def _lookup(data, name: str):
+    "resolves a dotted name in nested mappings, sequences and objects"
+    value = data
+    for part in name.split("."):
+        try:
+            value = value[part]
+            continue
+        except (KeyError, IndexError, TypeError):
+            pass
+        if part.isdigit():
+            try:
+                value = value[int(part)]
+                continue
+            except (KeyError, IndexError, TypeError):
+                pass
+        value = getattr(value, part, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _is_empty(value) -> bool:
+    "None and NaN-like values, e.g. empty DataFrame cells"
+    # pylint: disable-next=R0124
+    return value is None or (isinstance(value, float) and value != value) or (
+        type(value).__name__ in ("NaTType", "NAType"))
+
+
+class SafeField(Field):
+    """A ``{name}`` or ``{name|default}`` placeholder of a `SafeTemplate`."""
+
+    __slots__ = ("default",)
+
+    def __init__(self, name: str, default: str | None, at_line_start: bool):
+        super().__init__(name, None, "", at_line_start)
+        self.default = default
+
+    @property
+    def key(self) -> tuple:
+        return (self.name, self.default)
+
+    # pylint: disable-next=W0221
+    def format(
+        self,
+        data,
+        defaults: dict | None = None,
+        escape_values: bool = False,
+    ) -> str:
+        "looks the value up, falling back to ``defaults`` and the inline default"
+        value = _lookup(data, self.name)
+
+        if value is _MISSING or _is_empty(value):
+            if defaults and self.name in defaults:
+                value = defaults[self.name]
+            elif self.default is not None:
+                value = self.default
+            elif value is _MISSING:
+                raise KeyError(self.name)
+            else:
+                value = ""
+
+        text = str(value)
+        return escape_html(text) if escape_values else text
+
+
+class SafeTemplate(CompiledTemplate):
+    """A template with ``{name}`` placeholders that never breaks on braces.
+
+    Placeholders are ``{name}``, ``{nested.key}`` or ``{name|default}``.
+    Names are looked up in nested mappings (dicts, pandas Series), sequences
+    (``{items.0}``) and object attributes. Braces which are not a
+    placeholder, e.g. in CSS or code, are kept as they are, so the data does
+    not have to cover every brace of the template. ``{{name}}`` renders
+    as ``{name}``.
+    """
+
+    def _parse(self, text: str):
+        position = 0
+        for match in _PLACEHOLDER.finditer(text):
+            literal = text[position:match.start()]
+            position = match.end()
+            if match.group(1):
+                yield literal + match.group(0)[1:-1], None, None, None
+            else:
+                yield literal, match.group(2), "", match.group(3)
+        yield text[position:], None, None, None
+
+    def _field(
+        self, name: str, conversion: str | None, format_spec: str,
+        at_line_start: bool,
+    ) -> Field:
+        # the parser passes the inline default as conversion
+        return SafeField(name, conversion, at_line_start)
+
+    def _safe_values(self, data, defaults, escape_values) -> list[str]:
+        if data is None:
+            data = {}
+        return [
+            field.format(data, defaults, escape_values)
+            for field in self.unique_fields
+        ]
+
+    # pylint: disable-next=W0221
+    def render(
+        self,
+        data=None,
+        defaults: dict | None = None,
+        escape: bool = False,
+    ) -> str:
+        """Returns the template filled with ``data``.
+
+        Args:
+            data (Mapping, optional): values, e.g. a dict or a DataFrame row.
+            defaults (dict, optional): values of missing or empty
+                placeholders, by name. Take precedence over inline defaults.
+            escape (bool, optional): HTML-escape the values.
+                Defaults to False.
+
+        Raises:
+            KeyError: If a placeholder has neither a value nor a default.
+        """
+        return self._join(
+            self.literals,
+            self._safe_values(data, defaults, escape),
+            self.positions,
+        )
+
+    # pylint: disable-next=W0221
+    def render_html(
+        self,
+        data=None,
+        defaults: dict | None = None,
+        escape: bool = True,
+    ) -> str:
+        "like `render`, converted to HTML and escaping values by default"
+        return self._html_from_values(
+            self._safe_values(data, defaults, escape))
+
+
+_ENGINES = {"format": CompiledTemplate, "safe": SafeTemplate}
+
+
+def get_template(
+    path: str,
+    encoding: str = "utf-8",
+    engine: str = "format",
+) -> CompiledTemplate:
+    """Returns the compiled template of ``path``, compiling it when changed.
+
+    Args:
+        path (str): path of the template.
+        encoding (str, optional): encoding of the file. Defaults to 'utf-8'.
+        engine (str, optional): 'format' for `CompiledTemplate`, 'safe' for
+            `SafeTemplate`. Defaults to 'format'.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size, encoding)
+    key = (path, engine)
+
+    with _lock:
+        cached = _cache.get(key)
+
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with open(path, "r", encoding=encoding) as f:
+        template = _ENGINES[engine](f.read())
+
+    with _lock:
+        _cache[key] = (signature, template)
+    return template
+
+
+def clear_template_cache(path: str | None = None):
+    """Drops compiled templates.
+
+    Args:
+        path (str, optional): only drop this file. Drops every template
+            when None. Defaults to None.
+    """
+    with _lock:
+        if path is None:
+            _cache.clear()
+            return
+
+        path = os.path.realpath(path)
+        for key in [key for key in _cache if key[0] == path]:
+            del _cache[key]
+
+
+def render_many(
+    path: str,
+    rows: list[dict],
+    html: bool = True,
+    encoding: str = "utf-8",
+    engine: str = "format",
+    **options,
+) -> list[str]:
+    """Renders a template once per row.
+
+    Top level, so it can run in the workers of a process pool, which then
+    compile the template once each. ``options`` are passed to the render
+    method of `SafeTemplate`.
+    """
+    template = get_template(path, encoding, engine)
+    render = template.render_html if html else template.render
+    return [render(row, **options) for row in rows]
+
+
+_LIST_ITEM = re.compile(r"(?:[*+-]|\d+[.)])\s")
+_HTML_OPEN = re.compile(r"<([A-Za-z][\w-]*)")
+
+
+# opening and closing HTML of the elements a block can continue
+_ELEMENTS = {
+    "p": ("<p>", "</p>"),
+    "ul": ("<ul>\n", "\n</ul>"),
+    "ol": ("<ol>\n", "\n</ol>"),
+}
+
+
+def _item_kind(line: str) -> str | None:
+    "'ul' or 'ol' for a top level list item line, None otherwise"
+    if not _LIST_ITEM.match(line):
+        return None
+    return "ol" if line[0].isdigit() else "ul"
+
+
+def iter_blocks(lines, block_size: int = 65536):
+    """Groups markdown lines into blocks of at least ``block_size`` characters.
+
+    Blocks end before a line starting a new top level paragraph after a
+    blank line. They never end inside code, blockquotes or raw HTML, so
+    converting every block on its own gives the same HTML as converting the
+    whole document. Reference-style link definitions only apply within
+    their own block.
+
+    A long table or tight list is split between two rows or items. The
+    next block then continues the paragraph ('p') or list ('ul', 'ol') the
+    block ends with, and its HTML has to be merged into it, see `stream`.
+    Inline markup must not span two table rows. Any other paragraph stays
+    in one block.
+
+    Yields:
+        tuple[str, str | None]: the block, and the tag of the element the
+            next block continues, or None
+    """
+    lines = iter(lines)
+    block, size = [], 0
+    after_blank, fenced, html_tag = True, False, None
+    # element the current run of table rows or list items can be split in
+    run, list_open = None, False
+
+    line = next(lines, None)
+    while line is not None:
+        following = next(lines, None)
+        stripped = line.strip()
+        kind = _item_kind(line)
+        split, continues = False, None
+
+        if block and size >= block_size and not fenced and html_tag is None:
+            # the line after a split must not turn the first row or item of
+            # the next block into a setext heading
+            settled = following is None or not following.strip()
+            if (
+                after_blank
+                and stripped
+                and not line[0].isspace()
+                and not line.startswith(">")
+                and kind is None
+            ):
+                split = True
+            elif run == "p" and line.startswith("|"):
+                split = settled or following.startswith("|")
+                continues = run
+            elif run is not None and kind == run:
+                split = settled or _item_kind(following) is not None
+                continues = run
+
+        if split:
+            yield "".join(block), continues
+            block, size = [], 0
+
+        block.append(line)
+        size += len(line)
+
+        if stripped.startswith(("```", "~~~")):
+            fenced = not fenced
+        elif html_tag is None:
+            match = _HTML_OPEN.match(line)
+            if match and f"</{match.group(1)}" not in line:
+                html_tag = match.group(1)
+        elif f"</{html_tag}" in line:
+            html_tag = None
+
+        if not stripped:
+            run = None
+        elif after_blank and kind is not None:
+            # only a new list can be split, items after a blank line may
+            # continue a loose one
+            run = None if list_open else kind
+        elif after_blank and not line[0].isspace():
+            run = "p" if line.startswith("|") else None
+            list_open = False
+        elif after_blank or not (
+            line.startswith("|") if run == "p" else kind is not None
+        ):
+            # an indented line, or one that ends the table or list
+            run = None
+        list_open = list_open or kind is not None
+
+        after_blank = not stripped
+        line = following
+
+    if block:
+        yield "".join(block), None
+
+
+def stream(
+    path: str,
+    data=None,
+    html: bool = True,
+    engine: str = "format",
+    block_size: int = 65536,
+    encoding: str = "utf-8",
+    **options,
+):
+    """Renders a template block by block, see `iter_blocks`.
+
+    Only one block of the template and its output are in memory at a time.
+    The HTML of a block continuing a table or list is merged into the
+    element the previous block ended with. ``options`` are passed to the render method of `SafeTemplate`.
+
+    Yields:
+        str: consecutive parts of the output
+    """
+    # pylint: disable-next=C0415
+    import markdown
+
+    if data is None:
+        data = {}
+
+    converter = markdown.Markdown() if html else None
+    first = True
+    # element the current block continues, and the closing HTML held back
+    # from the previous block to merge it
+    previous, tail = None, ""
+
+    with open(path, "r", encoding=encoding) as f:
+        for block, continued in iter_blocks(f, block_size):
+            text = _ENGINES[engine](block).render(data, **options)
+
+            if converter is None:
+                yield text
+                continue
+
+            converted = converter.reset().convert(text)
+            if not converted:
+                continue
+
+            opening, closing = _ELEMENTS.get(previous, ("", None))
+            if tail == closing and converted.startswith(opening):
+                converted = "\n" + converted[len(opening):]
+            elif not first:
+                converted = tail + "\n" + converted
+            first, previous = False, continued
+
+            _, closing = _ELEMENTS.get(continued, ("", None))
+            tail = closing if closing and converted.endswith(closing) else ""
+            yield converted[:len(converted) - len(tail)]
+
+    if tail:
+        yield tail